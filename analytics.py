@@ -0,0 +1,186 @@
+# Game Analytics
+
+# Summaries of recorded games: how many guesses games took to solve, how
+# much each guess narrowed down the solution, and how players compare with
+# the solver. A recording is read a chunk of records at a time and the
+# candidate sets are worked out for a bounded number of games at once, so
+# memory stays flat however large the recording grows.
+
+import argparse
+import functools
+import json
+import numpy as np
+import pandas as pd
+from recording import DUPLICATES, OVER, WIN, load
+from solver import knuth_solve, load_table, opening_guess, table_fits
+
+# records read from the recording at a time
+CHUNK = 1 << 16
+
+# most candidate flags held at once, games x secrets
+CELLS = 1 << 24
+
+# columns games are grouped into players by
+PLAYER = ('source', 'players')
+
+VARIANT = ('pegs', 'colors', 'duplicates')
+
+# histogram bin edges for bits gained per guess, more lands in the last bin
+BITS = np.arange(0, 12.5, .5)
+
+
+def chunks(records, chunk=CHUNK):
+    """
+    yields record arrays made of whole games, reading chunk records at a
+    time, games still being played at the end of a chunk are held over for
+    the next one unless more than a chunk of them has built up
+    """
+    carry = records[:0]
+    for start in range(0, len(records), chunk):
+        block = np.concatenate([carry, records[start:start + chunk]])
+        done = np.isin(block['game'], block['game'][block['flags'] & OVER > 0])
+        if (~done).sum() > chunk:
+            done[:] = True
+
+        carry = block[~done]
+        if done.any():
+            yield block[done]
+
+    # games never finished
+    if len(carry):
+        yield carry
+
+
+def candidate_counts(records):
+    """
+    returns the number of solutions still possible before and after each
+    guess, for records made of whole games
+    """
+    before = np.zeros(len(records), np.int64)
+    after = np.zeros(len(records), np.int64)
+    duplicates = records['flags'] & DUPLICATES > 0
+    variants = np.stack([records['pegs'], records['colors'], duplicates], axis=1)
+
+    for pegs, colors, dup in np.unique(variants, axis=0):
+        ft = load_table(int(pegs), int(colors), bool(dup))
+        columns = np.arange(len(ft))
+        index = np.flatnonzero((variants == (pegs, colors, dup)).all(axis=1))
+        games, game_of = np.unique(records['game'][index], return_inverse=True)
+
+        # candidate flags are kept for a batch of games at a time
+        batch = max(1, CELLS // len(ft))
+        for first in range(0, len(games), batch):
+            rows = index[(game_of >= first) & (game_of < first + batch)]
+            game = np.searchsorted(games, records['game'][rows]) - first
+            consistent = np.ones((min(batch, len(games) - first), len(ft)), bool)
+
+            # every game's first guesses are applied before its second ones
+            moves = records['move'][rows]
+            for move in np.unique(moves):
+                at = moves == move
+                played, g = rows[at], game[at]
+                before[played] = consistent[g].sum(axis=1)
+                result = ft.feedback(records['guess'][played].astype(np.intp), columns)
+                consistent[g] &= result == records['result'][played][:, None]
+                after[played] = consistent[g].sum(axis=1)
+
+    return before, after
+
+
+@functools.lru_cache(maxsize=None)
+def solver_average(pegs=4, colors=6, duplicates=True):
+    """
+    average guesses knuth's algorithm takes over every solution, None for
+    variants too big to keep a feedback table
+    """
+    if not table_fits(pegs, colors, duplicates):
+        return None
+    ft = load_table(pegs, colors, duplicates)
+    first = opening_guess(pegs, colors, duplicates)
+    return sum(len(knuth_solve(ft, secret, first)) for secret in range(len(ft))) / len(ft)
+
+
+def analyze(path=None, chunk=CHUNK, reference=None):
+    """
+    streams a recording, returns the guesses to solve distribution, the
+    bits of information guesses gained, and each player's average against
+    the solver's. reference maps (pegs, colors, duplicates) to the average
+    guesses to compare with, e.g. the optimal strategy's, and defaults to
+    knuth's algorithm
+    """
+    solved = {}
+    unsolved = 0
+    bits = np.zeros(len(BITS) - 1, np.int64)
+    players = []
+
+    for records in chunks(load(path), chunk):
+        before, after = candidate_counts(records)
+        gain = np.log2(before / np.maximum(after, 1))
+        bits += np.histogram(np.minimum(gain, BITS[-1]), BITS)[0]
+
+        frame = pd.DataFrame({name: records[name] for name in ('game', 'move', 'pegs', 'colors') + PLAYER})
+        frame['duplicates'] = records['flags'] & DUPLICATES > 0
+        frame['over'] = records['flags'] & OVER > 0
+        frame['win'] = records['flags'] & WIN > 0
+        frame['bits'] = gain
+
+        # one row per finished game
+        games = frame[frame['over']]
+        for guesses, count in games[games['win']]['move'].add(1).value_counts().items():
+            solved[int(guesses)] = solved.get(int(guesses), 0) + int(count)
+        unsolved += int((~games['win']).sum())
+
+        # per player sums, combined once every chunk is read
+        won = games[games['win']]
+        sums = frame.groupby(list(PLAYER + VARIANT)).agg(guesses=('bits', 'size'), bits=('bits', 'sum'))
+        sums['games'] = games.groupby(list(PLAYER + VARIANT)).size()
+        sums['solved'] = won.groupby(list(PLAYER + VARIANT)).size()
+        sums['solved_guesses'] = won.groupby(list(PLAYER + VARIANT))['move'].sum() + sums['solved']
+        players.append(sums.fillna(0))
+
+    table = pd.concat(players).groupby(level=list(range(len(PLAYER + VARIANT)))).sum() if players else None
+    summary = {
+        'games': sum(solved.values()) + unsolved,
+        'guesses_to_solve': dict(sorted(solved.items())),
+        'unsolved': unsolved,
+        'mean_bits': None,
+        'bits_bins': BITS.tolist(),
+        'bits_histogram': bits.tolist(),
+        'players': [],
+    }
+    if table is None:
+        return summary
+    summary['mean_bits'] = float(table['bits'].sum() / table['guesses'].sum())
+
+    for key, row in table.iterrows():
+        player = dict(zip(PLAYER + VARIANT, (v.item() if hasattr(v, 'item') else v for v in key)))
+        variant = tuple(player[name] for name in VARIANT)
+        average = row['solved_guesses'] / row['solved'] if row['solved'] else None
+        best = (reference or {}).get(variant) or solver_average(*variant)
+        player.update({
+            'games': int(row['games']),
+            'solved': int(row['solved']),
+            'average_guesses': average,
+            'bits_per_guess': row['bits'] / row['guesses'],
+            'reference_guesses': best,
+            'efficiency': best / average if average and best else None,
+        })
+        summary['players'].append(player)
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Summarize recorded Mastermind games')
+    parser.add_argument('path', nargs='?', default=None)
+    parser.add_argument('--chunk', type=int, default=CHUNK)
+    parser.add_argument('--optimal', nargs='*', default=(),
+                        help='strategy files from optimal.py to compare players with instead of knuth')
+    args = parser.parse_args()
+
+    reference = {}
+    for path in args.optimal:
+        with open(path) as f:
+            stats = json.load(f)['stats']
+        reference[(stats['pegs'], stats['colors'], stats['duplicates'])] = stats['average_guesses']
+
+    print(json.dumps(analyze(args.path, args.chunk, reference), indent=2))
@@ -0,0 +1,191 @@
+# Benchmarks
+
+# Times scoring, board checks, the solver and rendering with fixed seeds so
+# runs can be compared. Small operations are timed call by call, the full
+# solver run and the headless frame once per round. Results are saved as
+# JSON, and compared against a saved baseline any benchmark whose ops/sec
+# fell by more than the threshold is reported as a regression.
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import time
+import numpy as np
+import pygame
+import setup
+import mastermind
+from terminal_game import Game
+from solver import knuth_solve, load_table, opening_guess
+
+BASELINE = 'bench_baseline.json'
+
+# fraction ops/sec may drop by before it counts as a regression
+THRESHOLD = .1
+
+
+def timed(op, calls):
+    """times calls of op one at a time, returns each call's seconds"""
+    times = np.empty(calls)
+    clock = time.perf_counter
+    for i in range(calls):
+        start = clock()
+        op()
+        times[i] = clock() - start
+    return times
+
+
+def terminal_feedback(rng):
+    game = Game(1, True)
+    game.create_solution()
+    guesses = [[rng.choice(game.colors) for _ in range(game.pegs)] for _ in range(256)]
+    calls = itertools.count()
+    return lambda: game.feedback(guesses[next(calls) % 256])
+
+
+def headless():
+    pygame.init()
+    setup.init_display(headless=True)
+
+
+def pygame_game(rng):
+    """a headless pygame game with every guess row filled in"""
+    headless()
+    game = mastermind.Game()
+    game.game_board()
+    game.fb_board()
+    for row in game.board[1:]:
+        for tile in row:
+            tile.update(rng.choice(game.colors))
+    return game
+
+
+def assign_feedback(rng):
+    game = pygame_game(rng)
+
+    def submit():
+        # the core starts over each call so the same first row is played
+        game.core.reset()
+        game.assign_feedback(game.max_guesses)
+    return submit
+
+
+def verification(rng):
+    """verification of a board played through to a win on its last row"""
+    game = pygame_game(rng)
+    for tile, color in zip(game.board[1], game.solution):
+        tile.update(color)
+    for row in range(game.max_guesses, 0, -1):
+        game.assign_feedback(row)
+    return game.verification
+
+
+def check_complete(rng):
+    game = pygame_game(rng)
+    return lambda: game.check_complete(game.max_guesses)
+
+
+def solve_all(rng):
+    """knuth's algorithm against every secret of the classic game"""
+    ft = load_table(4, 6, True)
+    first = opening_guess(4, 6, True)
+    return lambda: [knuth_solve(ft, secret, first) for secret in range(len(ft))]
+
+
+def render_frame(rng):
+    """one full frame of the board, drawn and flipped headlessly"""
+    headless()
+    session = mastermind.Session()
+    session.handle_key(pygame.K_SPACE)
+
+    # no hints are asked for
+    session.close()
+
+    def frame():
+        session.board_shown = False
+        session.render()
+    return frame
+
+
+# name -> (setup taking a seeded Random and returning the op, calls per round)
+BENCHMARKS = {
+    'terminal_feedback': (terminal_feedback, 2000),
+    'assign_feedback': (assign_feedback, 2000),
+    'verification': (verification, 2000),
+    'check_complete': (check_complete, 2000),
+    'solve_all': (solve_all, 1),
+    'render_frame': (render_frame, 200),
+}
+
+
+def run(names=None, rounds=5, seed=0):
+    """runs benchmarks, returns their results keyed by name"""
+    results = {}
+    for name in names or BENCHMARKS:
+        make, calls = BENCHMARKS[name]
+        random.seed(seed)
+        op = make(random.Random(seed))
+
+        # one warm up round fills caches and loads tables
+        timed(op, calls)
+        times = np.concatenate([timed(op, calls) for _ in range(rounds)])
+
+        p50, p90, p99 = np.percentile(times, [50, 90, 99]) * 1e6
+        results[name] = {'calls': len(times), 'seconds': float(times.sum()),
+                         'ops_per_sec': len(times) / float(times.sum()),
+                         'p50_us': float(p50), 'p90_us': float(p90), 'p99_us': float(p99)}
+    return results
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """
+    returns {name: (baseline ops/sec, ops/sec)} of benchmarks that ran more
+    than threshold slower than the baseline
+    """
+    regressions = {}
+    for name, result in results.items():
+        before = baseline.get(name, {}).get('ops_per_sec')
+        if before and result['ops_per_sec'] < before * (1 - threshold):
+            regressions[name] = (before, result['ops_per_sec'])
+    return regressions
+
+
+def environment():
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'pygame': pygame.version.ver,
+            'machine': platform.machine(), 'system': platform.system()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark Mastermind scoring, solving and rendering')
+    parser.add_argument('names', nargs='*', help='benchmarks to run, all of them by default: {}'.format(
+        ', '.join(BENCHMARKS)))
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='bench.json')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the baseline')
+    args = parser.parse_args()
+
+    report = {'environment': environment(), 'seed': args.seed, 'rounds': args.rounds,
+              'results': run(args.names or None, args.rounds, args.seed)}
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for name, result in report['results'].items():
+        print('{:<18} {:>12.1f} ops/s   p50 {:>10.1f} us   p99 {:>10.1f} us'.format(
+            name, result['ops_per_sec'], result['p50_us'], result['p99_us']))
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(report['results'], json.load(f)['results'], args.threshold)
+        for name, (before, after) in regressions.items():
+            print('REGRESSION {}: {:.1f} -> {:.1f} ops/s'.format(name, before, after))
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,170 @@
+# Opening Book
+
+# The solver's first few moves only depend on the game settings and the
+# feedback seen so far, so they are worked out once and saved to disk along
+# with the feedback table. The file is a flat binary layout that is memory
+# mapped when opened, so startup does no work and every process reading
+# the same book shares the same pages.
+#
+# Layout, little endian:
+#   header  one HEADER record, padded to ALIGN bytes
+#   nodes   int32 (nodes, 1 + slots): a guess then the node each packed
+#           feedback leads to, -1 where the book stops
+#   table   uint8 (rows, cols) feedback table, starting on an ALIGN boundary
+
+import os
+import tempfile
+import numpy as np
+from solver import load_table, opening_guess, knuth_guess, table_fits, use_table
+from symmetry import representatives
+
+# bump whenever the layout or the strategy that fills the book changes
+BOOK_VERSION = 1
+MAGIC = b'MMBOOK'
+ALIGN = 64
+
+# number of guesses covered by a book
+BOOK_DEPTH = 3
+
+HEADER = np.dtype([('magic', 'S8'), ('version', '<u4'), ('pegs', '<u4'), ('colors', '<u4'),
+                   ('duplicates', '<u4'), ('depth', '<u4'), ('slots', '<u4'), ('nodes', '<u4'),
+                   ('rows', '<u4'), ('cols', '<u4'), ('nodes_offset', '<u8'), ('table_offset', '<u8')])
+
+# opened books, keyed by (pegs, colors, duplicates)
+_books = {}
+
+
+def cache_dir():
+    """directory books are kept in, MASTERMIND_CACHE overrides the default"""
+    return os.environ.get('MASTERMIND_CACHE') or os.path.join(os.path.expanduser('~'), '.cache', 'mastermind')
+
+
+def book_path(pegs=4, colors=6, duplicates=True):
+    """file a variant's book is stored in"""
+    name = 'book-{}x{}-{}.bin'.format(pegs, colors, 'dup' if duplicates else 'nodup')
+    return os.path.join(cache_dir(), name)
+
+
+class OpeningBook:
+    """Memory mapped opening moves and feedback table for one game variant"""
+    def __init__(self, path):
+        header = np.fromfile(path, HEADER, count=1)[0]
+        self.path = path
+        self.header = header
+        self.nodes = np.memmap(path, '<i4', 'r', int(header['nodes_offset']),
+                               (int(header['nodes']), 1 + int(header['slots'])))
+        self.table = np.memmap(path, 'u1', 'r', int(header['table_offset']),
+                               (int(header['rows']), int(header['cols'])))
+
+    def matches(self, pegs, colors, duplicates, depth=BOOK_DEPTH):
+        """true if the book was built for these settings by this version"""
+        header = self.header
+        return (header['magic'] == MAGIC and header['version'] == BOOK_VERSION and
+                (header['pegs'], header['colors'], header['duplicates'], header['depth']) ==
+                (pegs, colors, int(duplicates), depth))
+
+    def guess(self, history):
+        """
+        returns the next numbered guess after a list of (guess, packed
+        feedback) rows, or None once play leaves the book
+        """
+        node = 0
+        for guess, result in history:
+            if self.nodes[node, 0] != guess:
+                return None
+            node = self.nodes[node, 1 + result]
+            if node < 0:
+                return None
+        return int(self.nodes[node, 0])
+
+
+def build_nodes(ft, depth=BOOK_DEPTH):
+    """plays out the knuth solver's first depth guesses for every secret"""
+    nodes = []
+
+    def add(candidates, played, depth):
+        if played:
+            guess = knuth_guess(ft, candidates, representatives(played, ft.pegs, ft.colors))
+        else:
+            guess = opening_guess(ft.pegs, ft.colors, ft.duplicates)
+        row = [guess] + [-1] * ft.slots
+        nodes.append(row)
+
+        if depth > 1:
+            result = ft.feedback([guess], candidates)[0]
+            for r in np.unique(result):
+                if r != ft.win:
+                    row[1 + r] = len(nodes)
+                    add(candidates[result == r], played + (guess,), depth - 1)
+
+    add(np.arange(len(ft)), (), depth)
+    return np.array(nodes, dtype='<i4')
+
+
+def write_book(path, pegs=4, colors=6, duplicates=True, depth=BOOK_DEPTH):
+    """builds a book and writes it to path in one atomic replace"""
+    ft = load_table(pegs, colors, duplicates)
+    nodes = build_nodes(ft, depth)
+
+    header = np.zeros(1, HEADER)
+    header['magic'] = MAGIC
+    header['version'] = BOOK_VERSION
+    header['pegs'], header['colors'], header['duplicates'], header['depth'] = pegs, colors, duplicates, depth
+    header['slots'] = ft.slots
+    header['nodes'] = len(nodes)
+    header['rows'], header['cols'] = ft.table.shape
+    header['nodes_offset'] = _aligned(HEADER.itemsize)
+    header['table_offset'] = _aligned(header['nodes_offset'][0] + nodes.nbytes)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as f:
+        f.write(header.tobytes())
+        f.seek(int(header['nodes_offset'][0]))
+        f.write(nodes.tobytes())
+        f.seek(int(header['table_offset'][0]))
+        f.write(np.ascontiguousarray(ft.table, dtype='u1').tobytes())
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
+
+
+def load_book(pegs=4, colors=6, duplicates=True):
+    """
+    opens the book for a variant, building it first if it is missing or
+    stale, returns None for variants too big to keep a feedback table or
+    when the cache directory can't be written
+    """
+    key = (pegs, colors, duplicates)
+    if key in _books:
+        return _books[key]
+
+    book = None
+    if table_fits(pegs, colors, duplicates):
+        path = book_path(pegs, colors, duplicates)
+        try:
+            book = _open(path)
+            if book is None or not book.matches(pegs, colors, duplicates):
+                write_book(path, pegs, colors, duplicates)
+                book = _open(path)
+        except OSError:
+            book = None
+
+    # the mapped table replaces the private copy built by the solver
+    if book is not None:
+        use_table(pegs, colors, duplicates, book.table)
+
+    _books[key] = book
+    return book
+
+
+def _open(path):
+    """opens a book file, None if it is missing or unreadable"""
+    try:
+        return OpeningBook(path)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _aligned(offset):
+    """rounds offset up to the next ALIGN boundary"""
+    return -(-int(offset) // ALIGN) * ALIGN
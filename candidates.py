@@ -0,0 +1,83 @@
+# Consistent Candidate Index
+
+# Tracks which secrets still agree with every row of feedback given so far.
+# Each new row only filters the survivors of the previous rows, so the cost
+# of an update shrinks as the game goes on and nothing is ever replayed.
+
+import numpy as np
+from solver import load_table
+
+
+class CandidateSet:
+    """Secrets consistent with all feedback so far, kept as a boolean mask"""
+    __slots__ = ('ft', 'mask', 'live')
+
+    def __init__(self, pegs=4, colors=6, duplicates=True):
+        self.ft = load_table(pegs, colors, duplicates)
+        self.mask = np.ones(len(self.ft), dtype=bool)
+
+        # column indices of the surviving secrets, in code order
+        self.live = np.arange(len(self.ft), dtype=np.int32)
+
+    def copy(self):
+        """returns an independent copy sharing the feedback table"""
+        other = CandidateSet.__new__(CandidateSet)
+        other.ft = self.ft
+        other.mask = self.mask.copy()
+        other.live = self.live.copy()
+        return other
+
+    def update(self, guess, result):
+        """filters survivors against one numbered guess and packed result"""
+        dropped = self.live[self.ft.feedback([guess], self.live)[0] != result]
+        self.mask[dropped] = False
+        self.live = self.live[self.mask[self.live]]
+
+    def partition(self, guess):
+        """counts survivors by the packed result a numbered guess would get"""
+        return np.bincount(self.ft.feedback([guess], self.live)[0], minlength=self.ft.slots)
+
+    def largest_partition(self, guess):
+        """
+        returns the packed result of a numbered guess that keeps the most
+        survivors, a win only once it is the sole survivor, ties go to the
+        smallest result
+        """
+        sizes = self.partition(guess)
+        if sizes.sum() > sizes[self.ft.win]:
+            sizes[self.ft.win] = 0
+        return int(sizes.argmax())
+
+    def answer(self, guess):
+        """
+        answers a numbered guess as an evil codemaker, with the result that
+        keeps the most survivors, returns (packed result, numbered secret
+        still consistent with every answer given)
+        """
+        result = self.largest_partition(guess)
+        self.update(guess, result)
+        return result, int(self.ft.rows[self.live[0]])
+
+    def reset(self):
+        """makes every secret a candidate again"""
+        self.mask[:] = True
+        self.live = np.arange(len(self.ft), dtype=np.int32)
+
+    def indices(self):
+        """returns column indices of the surviving secrets"""
+        return self.live
+
+    def codes(self):
+        """returns the surviving secrets as an (N, pegs) array of color indices"""
+        return self.ft.codes[self.live]
+
+    def __len__(self):
+        return len(self.live)
+
+    def __iter__(self):
+        """yields surviving secrets as numbered codes"""
+        return iter(self.ft.rows[self.live].tolist())
+
+    def __contains__(self, code):
+        column = self.ft.column(code)
+        return column is not None and bool(self.mask[column])
@@ -0,0 +1,71 @@
+# Frame Statistics
+
+# Rolling timings for the pygame game: how long each part of a frame took
+# and how long key presses took to reach the screen. Only the last WINDOW
+# samples of each timing are kept. They can be summarized for the on screen
+# overlay or saved as histograms to compare one build against another.
+
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+
+# samples kept per timing, 20 seconds at 30 fps
+WINDOW = 600
+
+# histogram bin edges in milliseconds, slower samples land in the last bin
+BINS_MS = [0, .25, .5, 1, 2, 4, 8, 16, 33, 66, 133, 266, 1000]
+
+
+class FrameStats:
+    """Rolling timings in seconds, kept by name"""
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self.samples = {}
+
+    def record(self, name, seconds):
+        """adds one sample to a timing"""
+        if name not in self.samples:
+            self.samples[name] = deque(maxlen=self.window)
+        self.samples[name].append(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        """records how long the with block took"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def milliseconds(self, name):
+        """samples of a timing in milliseconds"""
+        return np.fromiter(self.samples.get(name, ()), float) * 1000
+
+    def percentile(self, name, q):
+        """q-th percentile of a timing in milliseconds, None with no samples"""
+        ms = self.milliseconds(name)
+        return float(np.percentile(ms, q)) if len(ms) else None
+
+    def summary(self):
+        """count, mean, p50, p99 and max milliseconds of each timing"""
+        summary = {}
+        for name in sorted(self.samples):
+            ms = self.milliseconds(name)
+            if len(ms):
+                p50, p99 = np.percentile(ms, [50, 99])
+                summary[name] = {'count': len(ms), 'mean_ms': float(ms.mean()), 'p50_ms': float(p50),
+                                 'p99_ms': float(p99), 'max_ms': float(ms.max())}
+        return summary
+
+    def histograms(self):
+        """sample counts of each timing in the BINS_MS bins"""
+        return {name: np.histogram(np.minimum(self.milliseconds(name), BINS_MS[-1]), BINS_MS)[0].tolist()
+                for name in sorted(self.samples)}
+
+    def dump(self, path):
+        """writes the summary and histograms as JSON"""
+        with open(path, 'w') as f:
+            json.dump({'window': self.window, 'bins_ms': BINS_MS, 'summary': self.summary(),
+                       'histograms': self.histograms()}, f, indent=2)
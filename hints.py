@@ -0,0 +1,94 @@
+# Hints
+
+# Works out the best next guess for the pygame board on a background thread
+# so the frame loop never waits on the solver. Answers come back as HINT
+# events on the pygame event queue. Each request gets a generation number,
+# and a request overtaken by a newer one or a cancel is dropped instead of
+# being posted.
+
+import threading
+import traceback
+import pygame
+from scoring import decode
+from solver import opening_guess, knuth_guess
+from candidates import CandidateSet
+from symmetry import representatives
+
+# event type hints are posted as, with generation, guess (color indices)
+# and candidates attributes
+HINT = pygame.event.custom_type()
+
+
+def suggest(history, pegs=4, colors=6, duplicates=True):
+    """
+    returns (knuth's next guess as color indices, number of solutions
+    left) after a list of (numbered guess, packed feedback) rows
+    """
+    candidates = CandidateSet(pegs, colors, duplicates)
+    for guess, result in history:
+        candidates.update(guess, result)
+
+    if not history:
+        code = opening_guess(pegs, colors, duplicates)
+    else:
+        guesses = representatives([guess for guess, _ in history], pegs, colors)
+        code = knuth_guess(candidates.ft, candidates.indices(), guesses)
+    return decode(code, pegs, colors), len(candidates)
+
+
+class HintEngine:
+    """One worker thread answering the latest hint request"""
+    def __init__(self):
+        self.generation = 0
+        self.pending = None
+        self.closed = False
+        self.wake = threading.Condition()
+        self.thread = threading.Thread(target=self.work, daemon=True)
+        self.thread.start()
+
+    def request(self, history, pegs=4, colors=6, duplicates=True):
+        """asks for a hint, replacing any request not yet answered"""
+        with self.wake:
+            self.generation += 1
+            self.pending = (self.generation, history, pegs, colors, duplicates)
+            self.wake.notify()
+        return self.generation
+
+    def cancel(self):
+        """drops the request in flight, if any"""
+        with self.wake:
+            self.generation += 1
+            self.pending = None
+
+    def current(self, event):
+        """true if a HINT event answers the latest request"""
+        return event.generation == self.generation
+
+    def close(self):
+        """stops the worker thread, once any hint it is working out is done"""
+        with self.wake:
+            self.closed = True
+            self.generation += 1
+            self.pending = None
+            self.wake.notify()
+        self.thread.join()
+
+    def work(self):
+        while True:
+            with self.wake:
+                while self.pending is None and not self.closed:
+                    self.wake.wait()
+                if self.closed:
+                    return
+                generation, history, pegs, colors, duplicates = self.pending
+                self.pending = None
+
+            # a request that fails is reported and dropped, the worker carries on
+            try:
+                guess, candidates = suggest(history, pegs, colors, duplicates)
+            except Exception:
+                traceback.print_exc()
+                continue
+            if generation == self.generation:
+                pygame.event.post(pygame.event.Event(HINT, generation=generation, guess=guess,
+                                                     candidates=candidates))
@@ -0,0 +1,86 @@
+# Load Generator
+
+# Plays many single player games against a game server at once, each
+# client guessing at random over its own connection, and reports games
+# finished per second and how long the server took to answer each guess.
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import numpy as np
+import server
+
+
+async def client(host, port, games, latencies, rng):
+    """plays games one after another over one connection"""
+    reader, writer = await asyncio.open_connection(host, port)
+
+    async def call(message):
+        writer.write(json.dumps(message).encode() + b'\n')
+        await writer.drain()
+        reply = json.loads(await reader.readline())
+        if not reply['ok']:
+            raise RuntimeError(reply['error'])
+        return reply
+
+    for _ in range(games):
+        game = await call({'op': 'new'})
+        over = False
+        while not over:
+            guess = [rng.choice(game['colors']) for _ in range(game['pegs'])]
+            start = time.perf_counter()
+            over = (await call({'op': 'guess', 'game': game['game'], 'guess': guess}))['over']
+            latencies.append(time.perf_counter() - start)
+
+    writer.close()
+    await writer.wait_closed()
+
+
+async def run(sessions=1000, clients=100, host=server.HOST, port=server.PORT, local=False, seed=None):
+    """
+    plays sessions games spread over clients connections, against a server
+    started in this process when local, returns the throughput and latency
+    """
+    if local:
+        local_server = await server.start(host, 0)
+        port = local_server.sockets[0].getsockname()[1]
+
+    rng = random.Random(seed)
+    clients = min(clients, sessions)
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*[client(host, port, sessions // clients + (i < sessions % clients), latencies,
+                                  random.Random(rng.random())) for i in range(clients)])
+    seconds = time.perf_counter() - start
+
+    if local:
+        local_server.close()
+        await local_server.wait_closed()
+
+    ms = np.array(latencies) * 1000
+    p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+    return {
+        'sessions': sessions,
+        'clients': clients,
+        'moves': len(ms),
+        'seconds': seconds,
+        'sessions_per_sec': sessions / seconds,
+        'moves_per_sec': len(ms) / seconds,
+        'latency_ms': {'p50': float(p50), 'p90': float(p90), 'p99': float(p99), 'max': float(ms.max())},
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test a Mastermind game server')
+    parser.add_argument('--sessions', type=int, default=1000)
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--host', default=server.HOST)
+    parser.add_argument('--port', type=int, default=server.PORT)
+    parser.add_argument('--local', action='store_true', help='start a server in this process')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    stats = asyncio.run(run(args.sessions, args.clients, args.host, args.port, args.local, args.seed))
+    print(json.dumps(stats, indent=2))
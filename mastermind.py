@@ -1,24 +1,89 @@
+import argparse
 import sys
+import time
 import random
 from setup import *
+import terminal_game
+from frame_stats import FrameStats
+from recording import PYGAME, open_recorder
+from hints import HINT, HintEngine
 from pygame.locals import *
 
 
 class Game:
-    """Class representing the game"""
-    def __init__(self):
+    """
+    Class representing the game, the rules are played out by the same game
+    core the terminal and simulations use, with tile colors for pegs
+    """
+    def __init__(self, pegs=COLUMNS, colors=None, guesses=ROWS - 1, duplicates=False, recorder=None, evil=False):
         self.board = []
         self.feedback = []
-        self.colors = [RED, YELLOW, BLUE, GREEN, ORANGE, PURPLE]
-        self.solution = random.sample(self.colors, 4)
+        self.colors = list(colors) if colors else [RED, BLUE, YELLOW, GREEN, ORANGE, PURPLE]
+        self.pegs = pegs
+        self.max_guesses = guesses
+        self.duplicates = duplicates
+        self.evil = evil
+
+        # the last guess row has to end above the legend, the feedback grid
+        # inside the window
+        if TOPMARGIN + TILELOC * guesses + TILESIZE > LEGENDTOP:
+            raise ValueError('at most {} guesses fit the window'.format(
+                (LEGENDTOP - TOPMARGIN - TILESIZE) // TILELOC))
+        if feedback_right(pegs) > WINDOWWIDTH:
+            raise ValueError('at most {} pegs fit the window'.format(
+                max(n for n in range(1, pegs) if feedback_right(n) <= WINDOWWIDTH)))
+        self.core = terminal_game.Game(1, duplicates, pegs, self.colors, guesses, evil)
+
+        # records every submitted row when set
+        if recorder is not None:
+            self.core.subscribe(recorder)
+        self.create_solution()
 
     # GAME FUNCTIONS
+    @property
+    def solution(self):
+        return self.core.solution
+
+    @solution.setter
+    def solution(self, solution):
+        self.core.solution = solution
+
+    @property
+    def turn(self):
+        """board row the next guess goes in"""
+        return self.core.guess_counter + 1
+
+    def subscribe(self, observer):
+        """registers observer(event, core) for the core's 'guess', 'win' and 'lose' events"""
+        self.core.subscribe(observer)
+
+    def create_solution(self):
+        """picks a new random solution"""
+        self.core.create_solution()
+
+    def reset(self):
+        """
+        starts over with a new solution, blanking the tiles already built
+        rather than making new ones
+        """
+        self.core.reset()
+        self.create_solution()
+
+        for j, square in enumerate(self.board[0]):
+            # solution stays hidden behind black
+            square.update(BLACK)
+            square.color = self.solution[j]
+
+        for row in self.board[1:] + self.feedback:
+            for square in row:
+                square.update(TILE)
+
     def game_board(self):
         """Initializes main game board matrix structure"""
 
-        for i in range(ROWS):
+        for i in range(self.max_guesses + 1):
             columns = []
-            for j in range(COLUMNS):
+            for j in range(self.pegs):
                 # make top row the solution row
                 if i == 0:
                     # fill color black to hide solution
@@ -38,58 +103,57 @@ class Game:
 
     def fb_board(self):
         """Creates feedback matrix structure"""
-        for i in range(1, ROWS):
-            columns = []
-            for j in range(COLUMNS):
+        # feedback tiles sit in a grid two high inside the guess row's band,
+        # just right of the guess row
+        left = FBLEFTMARGIN + TILELOC * (self.pegs - 4)
+        wide = (self.pegs + 1) // 2
 
-                if j > 1:
-                    fb_square = GameTile(j, i, TILE, TILELOC, FBSIZE, FBLEFTMARGIN - 80, FBTOPMARGIN - 30, .5)
-                else:
-                    fb_square = GameTile(j, i, TILE, TILELOC, FBSIZE, FBLEFTMARGIN, FBTOPMARGIN, .5)
+        for i in range(1, self.max_guesses + 1):
+            columns = []
+            for j in range(self.pegs):
+                fb_square = GameTile(j % wide, i, TILE, TILELOC, FBSIZE, left, FBTOPMARGIN - 30 * (j // wide), .5)
                 columns.append(fb_square)
 
             self.feedback.append(columns)
 
         return self.feedback
 
-    def draw_board(self):
-        """draws main board data structure to the screen"""
-        for i in range(len(self.board)):
-            for j in range(len(self.board[i])):
-                square = self.board[i][j]
-                square.draw()
+    def draw_board(self, full=False):
+        """
+        draws changed tiles of the main board to the screen, or every tile
+        when full, returns the screen rects drawn to
+        """
+        return draw_tiles(self.board, full)
 
-    def draw_feedback(self):
-        """draws feedback data structure to the screen"""
-        for i in range(len(self.feedback)):
-            for j in range(len(self.feedback[i])):
-                fb_square = self.feedback[i][j]
-                fb_square.draw()
+    def draw_feedback(self, full=False):
+        """
+        draws changed tiles of the feedback board to the screen, or every
+        tile when full, returns the screen rects drawn to
+        """
+        return draw_tiles(self.feedback, full)
 
     def assign_feedback(self, row):
-        """colors feedback tiles based on user input"""
-        # get game arrays
-        sol = [tile.color for tile in self.board[0]]
-        guess = [tile.color for tile in self.board[row]]
-        result = self.feedback[row - 1]
+        """
+        plays a row through the game core and colors its feedback tiles,
+        returns True when every peg is black
+        """
+        core = self.core
+        if not core.guess_row([tile.color for tile in self.board[row]]):
+            return False
+        black, white = divmod(core.results[core.max_guesses - 2 - core.guess_counter], self.pegs + 1)
 
-        # array of indices to randomize black and white tiles
-        choices = [0, 1, 2, 3]
-        for i in range(len(sol)):
-            if sol[i] == guess[i]:
-                choice = random.choice(choices)
-                result[choice].update(BLACK)
-                choices.remove(choice)
+        if self.evil:
+            # the solution moves with each answer an evil codemaker gives
+            for tile, color in zip(self.board[0], self.solution):
+                tile.color = color
 
-            elif sol[i] in guess:
-                choice = random.choice(choices)
-                result[choice].update(WHITE)
-                choices.remove(choice)
+        # random tile indices so feedback order doesn't give away positions
+        result = self.feedback[row - 1]
+        choices = random.sample(range(self.pegs), black + white)
+        for i, choice in enumerate(choices):
+            result[choice].update(BLACK if i < black else WHITE)
 
-        # if all tiles match
-        result = [tile.color for tile in result]
-        if result == [BLACK, BLACK, BLACK, BLACK]:
-            return True
+        return black == self.pegs
 
     def reveal_solution(self):
         """reveals solution when game has ended"""
@@ -104,29 +168,20 @@ class Game:
                 return False
         return True
 
+    def history(self):
+        """(numbered guess, packed feedback) of the rows submitted, oldest first"""
+        return self.core.history()
+
     def verification(self):
-        """
-        verification algorithm, given the board a solution can be proved
-        in polynomial time
-        """
-        # tracks both verification steps
-        verified = 0
-
-        # check each feedback row
-        for row in self.feedback:
-            if [x.color for x in row] == [BLACK, BLACK, BLACK, BLACK]:
-                verified += 1
-
-        # check each guess row
-        for i in range(1, len(self.board)):
-            if [x.color for x in self.board[i]] == self.solution:
-                verified += 1
-
-        if verified == 2:
-            return True
-        else:
+        """true when the core verifies the last row submitted as the solution"""
+        history = self.core.history()
+        if not history:
             return False
 
+        code, result = history[-1]
+        black, white = divmod(result, self.pegs + 1)
+        return self.core.verification(self.core.decode(code), ['B'] * black + ['W'] * white)
+
 
 # TILE SPRITE CLASSES
 class GameTile(pygame.sprite.Sprite):
@@ -139,150 +194,313 @@ class GameTile(pygame.sprite.Sprite):
         self.xm = xm
         self.ym = ym
         self.buff = buff
-        self.image = pygame.Surface([self.size, self.size])
-        self.image.fill(color)
+        self.image = tile_image(color, self.size)
         self.color = color
         self.rect = self.image.get_rect()
         self.rect.x = x
         self.rect.y = y
 
-    def draw(self):
-        """draws tile to screen"""
-        rect = ((self.loc * self.rect.x * self.buff) + self.xm, (self.loc * self.rect.y) + self.ym,
-                self.size, self.size)
-        SCREEN.blit(self.image, rect)
+        # where the tile sits on screen, and whether it changed since drawn
+        self.screen_rect = pygame.Rect((self.loc * x * self.buff) + self.xm, (self.loc * y) + self.ym,
+                                       self.size, self.size)
+        self.dirty = True
 
-    def update(self, color):
-        """updates tile"""
-        self.image.fill(color)
+    def update(self, color, border=False):
+        """updates tile, it is drawn with the next changed tiles"""
+        self.image = tile_image(color, self.size, border)
         self.color = color
-
-        # adds border to tile
-        pygame.draw.rect(SCREEN, BLACK, ((self.loc * self.rect.x * self.buff) + self.xm,
-                                         (self.loc * self.rect.y) + self.ym, self.size, self.size), 10)
-        self.draw()
+        self.dirty = True
         return self.color
 
     def get_color(self):
         return self.color
 
 
-# MAIN GAME
-def main():
-    # game initialization/setup
-    pygame.init()
-    pygame.display.set_caption('Mastermind')
-    clock = pygame.time.Clock()
-
-    # game states
-    game_over = False
-    intro = True
-
-    # initialize game and feedback board
-    game = Game()
-    board = game.game_board()
-    game.fb_board()
-
-    # set turn counter to last row
-    turn_counter = ROWS - 1
-
-    # fresh screen
-    SCREEN.fill(BGCOLOR)
-
-    if intro:
-        start_screen()
-
-    # tile color options
-    tile_colors = [TILE, RED, BLUE, YELLOW, GREEN, ORANGE, PURPLE]
-
-    # tracks left-right and up-down to select color and column
-    key_pos = 0
-    color_index = 0
-
-    # main game loop
-    while True:
-
-        events = pygame.event.get()
-        for event in events:
-            # exit game
-            if event.type == QUIT or (event.type == KEYUP and event.key == K_ESCAPE):
-                pygame.quit()
-                sys.exit()
-
-            # Start game
-            if event.type == KEYDOWN:
-                if event.key == K_SPACE:
-                    intro = False
-
-            keys = pygame.key.get_pressed()
-
-            if not intro and not game_over:
-                # fresh screen with legend
-                SCREEN.fill(BGCOLOR)
-                main_legend()
+def feedback_right(pegs):
+    """right edge of a row of feedback tiles for a peg count"""
+    return FBLEFTMARGIN + TILELOC * (pegs - 4) + TILELOC // 2 * ((pegs - 1) // 2) + FBSIZE
 
-                # draw boards to screen
-                game.draw_board()
-                game.draw_feedback()
 
-                # borders first tile
-                board[turn_counter][key_pos].update(tile_colors[color_index])
+def draw_tiles(rows, full=False):
+    """
+    draws the changed tiles of rows, or all of them when full, in a single
+    blits call, returns the screen rects drawn to
+    """
+    tiles = [tile for row in rows for tile in row if full or tile.dirty]
+    get_screen().blits([(tile.image, tile.screen_rect) for tile in tiles], False)
 
-                # left-right keys change column, up-down changes color
-                if event.type == KEYDOWN and not game_over:
-                    if keys[K_LEFT] and key_pos > 0:
+    for tile in tiles:
+        tile.dirty = False
+    return [tile.screen_rect for tile in tiles]
 
-                        left_color = board[turn_counter][key_pos - 1].get_color()
-                        color_index = tile_colors.index(left_color)
-                        key_pos -= 1
 
-                    if keys[K_RIGHT] and key_pos < 3:
-
-                        right_color = board[turn_counter][key_pos + 1].get_color()
-                        color_index = tile_colors.index(right_color)
-                        key_pos += 1
-
-                    if keys[K_UP] and color_index < 6:
-                        color_index += 1
-
-                    if keys[K_DOWN] and color_index > 1:
-                        color_index -= 1
-
-                    # updates board according to input
-                    board[turn_counter][key_pos].update(tile_colors[color_index])
-
-                    # If Enter pressed, assign feedback, decrement turn_counter
-                    if keys[K_RETURN] and turn_counter >= 1 and game.check_complete(turn_counter):
-                        color_index = 0
-
-                        # if player wins
-                        if game.assign_feedback(turn_counter) and game.verification():
-
-                            game_over = True
-                            game.reveal_solution()
-                            finish_screen('p')
-                        else:
-                            turn_counter -= 1
-                            key_pos = 0
-
-                    # if cpu wins
-                    if turn_counter < 1 and not game.verification():
-                        game.reveal_solution()
-                        game_over = True
-                        finish_screen('c')
-                        turn_counter += 1
-
-            # Reset Game
-            if keys[K_n]:
-                main()
-
-            # New Game
-            if keys[K_SPACE] and game_over:
-                main()
+# MAIN GAME
+class Session:
+    """
+    Drives one window of play through the intro, playing and game over
+    states. Starting a new game resets the same game and tiles in place.
+    H asks for a hint, F3 toggles the frame stats overlay and F4 saves the
+    stats to stats_path.
+    """
+    def __init__(self, game=None, stats_path='frame_stats.json'):
+        self.game = game or Game()
+        self.board = self.game.game_board()
+        self.game.fb_board()
+
+        # tile color options
+        self.tile_colors = [TILE] + self.game.colors
+
+        # frame timings, shown over the game when overlay is on
+        self.stats = FrameStats()
+        self.stats_path = stats_path
+        self.overlay = False
+
+        # hints are worked out off the frame loop, shown beside the turn row
+        self.hints = HintEngine()
+        self.hint_rect = None
+        self.new_game()
+
+    def new_game(self):
+        """back to the start screen with a fresh solution"""
+        self.game.reset()
+        self.state = 'intro'
+
+        # set turn counter to last row
+        self.turn_counter = self.game.max_guesses
+
+        # tracks left-right and up-down to select color and column
+        self.key_pos = 0
+        self.color_index = 0
+
+        # screen rects changed since the last display update, None for all of it
+        self.changed = None
+        self.board_shown = False
+        self.clear_hint()
+
+        # fresh screen
+        get_screen().fill(BGCOLOR)
+        start_screen(self.game.pegs, len(self.game.colors), self.game.duplicates)
+
+    def handle_key(self, key):
+        """applies one key press to the game"""
+        game, board, tile_colors = self.game, self.board, self.tile_colors
+
+        # frame stats
+        if key == K_F3:
+            self.toggle_overlay()
+            return
+
+        if key == K_F4:
+            self.stats.dump(self.stats_path)
+            return
+
+        # Reset Game / New Game
+        if key == K_n or (key == K_SPACE and self.state == 'over'):
+            self.new_game()
+            return
+
+        # Start game
+        if key == K_SPACE:
+            self.state = 'playing'
+
+        if self.state != 'playing':
+            return
+
+        if key == K_h:
+            self.hints.request(game.history(), game.pegs, len(game.colors), game.duplicates)
+            return
+
+        # any other key may change the board, so a hint shown or on its way is dropped
+        self.clear_hint()
+
+        # the selected tile loses its border when left or submitted
+        selected = board[self.turn_counter][self.key_pos]
+        selected.update(selected.color)
+
+        # left-right keys change column, up-down changes color
+        if key == K_LEFT and self.key_pos > 0:
+
+            left_color = board[self.turn_counter][self.key_pos - 1].get_color()
+            self.color_index = tile_colors.index(left_color)
+            self.key_pos -= 1
+
+        if key == K_RIGHT and self.key_pos < game.pegs - 1:
+
+            right_color = board[self.turn_counter][self.key_pos + 1].get_color()
+            self.color_index = tile_colors.index(right_color)
+            self.key_pos += 1
+
+        if key == K_UP and self.color_index < len(game.colors):
+            self.color_index += 1
+
+        if key == K_DOWN and self.color_index > 1:
+            self.color_index -= 1
+
+        # updates board according to input
+        board[self.turn_counter][self.key_pos].update(tile_colors[self.color_index])
+
+        # If Enter pressed, the core plays the row and the turn moves up a row
+        if key == K_RETURN and game.check_complete(self.turn_counter):
+            self.color_index = 0
+            game.assign_feedback(self.turn_counter)
+
+            # if player wins
+            if game.core.player_win:
+                self.game_over('p')
+
+            # if cpu wins
+            elif game.core.game_over:
+                self.game_over('c')
+
+            else:
+                self.turn_counter = game.turn
+                self.key_pos = 0
+
+        # borders the selected tile
+        if self.state == 'playing':
+            selected = board[self.turn_counter][self.key_pos]
+            selected.update(selected.color, border=True)
+
+    def game_over(self, outcome):
+        """reveals the solution under the finish screen for outcome"""
+        self.state = 'over'
+        self.game.reveal_solution()
+        self.game.draw_board()
+        self.game.draw_feedback()
+        finish_screen(outcome)
+        self.changed = None
+
+    def show_hint(self, event):
+        """draws a hint beside the turn row, unless it was asked for before a change"""
+        if self.hints.current(event) and self.state == 'playing':
+            self.clear_hint()
+            self.hint_rect = hint_panel([self.game.colors[i] for i in event.guess], event.candidates,
+                                        TOPMARGIN + TILELOC * self.turn_counter)
+            if self.changed is not None:
+                self.changed.append(self.hint_rect)
+
+    def clear_hint(self):
+        """cancels any hint request and blanks the hint shown"""
+        self.hints.cancel()
+        if self.hint_rect is not None:
+            get_screen().fill(BGCOLOR, self.hint_rect)
+            if self.changed is not None:
+                self.changed.append(self.hint_rect)
+            self.hint_rect = None
+
+    def toggle_overlay(self):
+        """shows or hides the frame stats overlay"""
+        self.overlay = not self.overlay
+        if not self.overlay:
+            rect = get_screen().fill(BGCOLOR, OVERLAY)
+            if self.changed is not None:
+                self.changed.append(rect)
+
+    def overlay_lines(self):
+        """fps and p50 / p99 frame and key press to screen times"""
+        stats = self.stats
+        interval = stats.milliseconds('interval')
+        lines = ['FPS {:.1f}'.format(1000 / interval.mean() if len(interval) and interval.mean() else 0)]
+        for label, name in (('FRAME', 'frame'), ('KEY', 'latency')):
+            p50, p99 = stats.percentile(name, 50), stats.percentile(name, 99)
+            if p50 is not None:
+                lines.append('{} {:.1f} / {:.1f} MS'.format(label, p50, p99))
+        return lines
+
+    def render(self):
+        """draws what changed since the last frame and updates the display"""
+        game, stats = self.game, self.stats
+
+        if self.state != 'intro' and not self.board_shown:
+            # fresh screen with legend the first time the board shows
+            get_screen().fill(BGCOLOR)
+            with stats.timer('legend'):
+                main_legend(game.duplicates)
+            with stats.timer('board'):
+                game.draw_board(full=True)
+            with stats.timer('feedback'):
+                game.draw_feedback(full=True)
+            self.board_shown = True
+            self.changed = None
+
+        elif self.state == 'playing' and self.changed is not None:
+            # only tiles that changed are redrawn
+            with stats.timer('board'):
+                self.changed += game.draw_board()
+            with stats.timer('feedback'):
+                self.changed += game.draw_feedback()
+
+        # overlay goes over everything else
+        if self.overlay:
+            rect = stats_overlay(self.overlay_lines())
+            if self.changed is not None:
+                self.changed.append(rect)
+
+        with stats.timer('flip'):
+            if self.changed is None:
+                pygame.display.update()
+            elif self.changed:
+                pygame.display.update(self.changed)
+        self.changed = []
+
+    def frame(self):
+        """handles the queued events and renders one frame"""
+        stats = self.stats
+        start = time.perf_counter()
+
+        # drain every queued event first, key presses are applied in order
+        pressed = None
+        with stats.timer('events'):
+            for event in pygame.event.get():
+                # exit game
+                if event.type == QUIT or (event.type == KEYUP and event.key == K_ESCAPE):
+                    pygame.quit()
+                    sys.exit()
+
+                if event.type == KEYDOWN:
+                    pressed = pressed or time.perf_counter()
+                    self.handle_key(event.key)
+
+                if event.type == HINT:
+                    self.show_hint(event)
+
+        # render once per frame
+        self.render()
+
+        # key press latency runs from taking the first press off the queue
+        # until the display has been updated
+        end = time.perf_counter()
+        if pressed is not None:
+            stats.record('latency', end - pressed)
+        stats.record('frame', end - start)
+
+    def close(self):
+        """stops the hint worker, the session is done with"""
+        self.hints.close()
+
+    def run(self, fps=FPS):
+        """main game loop, one frame per pass until the window is closed"""
+        clock = pygame.time.Clock()
+        try:
+            while True:
+                self.frame()
+                self.stats.record('interval', clock.tick(fps) / 1000)
+        finally:
+            self.close()
+
+
+def main(headless=False, fps=FPS, record=True, evil=False):
+    # game initialization/setup
+    pygame.init()
+    pygame.display.get_surface() or init_display(headless)
+    pygame.display.set_caption('Mastermind')
 
-            pygame.display.update()
-            clock.tick(30)
+    # games are recorded to the default log, written out on exit
+    recorder = open_recorder(source=PYGAME) if record else None
+    Session(Game(recorder=recorder, evil=evil)).run(fps)
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='Play Mastermind')
+    parser.add_argument('--evil', action='store_true', help='the codemaker avoids committing to a solution')
+    main(evil=parser.parse_args().evil)
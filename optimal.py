@@ -0,0 +1,214 @@
+# Optimal Strategy Search
+
+# Finds the decision tree with the fewest guesses on average over every
+# secret (about 4.34 for the classic game). Each candidate set is solved by
+# branch and bound: guesses are tried in order of a lower bound on their
+# cost and dropped as soon as they can't beat the best found so far. Solved
+# candidate sets are memoized, and the first level of the tree is split
+# across a process pool.
+
+import argparse
+import json
+import multiprocessing
+import time
+import numpy as np
+from scoring import decode, unpack
+from solver import attach_table, load_table, shared_table
+from symmetry import representatives
+
+# search state for the worker processes
+_search = None
+
+
+def lower_bound(size):
+    """fewest total guesses for size candidates: one solved per guess at best"""
+    return np.where(size > 0, 2 * size - 1, 0)
+
+
+def feedback_key(result, pegs):
+    """labels a packed feedback value, e.g. 2B1W"""
+    black, white = unpack(int(result), pegs)
+    return '{}B{}W'.format(black, white)
+
+
+class Search:
+    """Branch and bound search for the strategy with the fewest total guesses"""
+    def __init__(self, ft):
+        self.ft = ft
+        # candidate set -> (total guesses, best guess) once solved exactly
+        self.memo = {}
+        # candidate set -> total guesses it is known to need at least
+        self.bounds = {}
+        self.nodes = 0
+
+    def solve(self, candidates, played=(), cap=np.inf):
+        """
+        returns the fewest total guesses to solve every candidate, or some
+        value of at least cap when that many can't be beaten
+        """
+        n = len(candidates)
+        if n <= 2:
+            return 2 * n - 1
+
+        key = candidates.tobytes()
+        if key in self.memo:
+            return self.memo[key][0]
+        if self.bounds.get(key, 0) >= cap:
+            return self.bounds[key]
+
+        self.nodes += 1
+        ft = self.ft
+        guesses = representatives(played, ft.pegs, ft.colors)
+        sizes = np.concatenate([s for _, s in ft.partitions(candidates, guesses)])
+
+        # a guess that wins needs nothing more for its own secret
+        sizes[:, ft.win] = 0
+        bounds = n + lower_bound(sizes).sum(axis=1)
+
+        best, best_guess = cap, None
+        for i in np.argsort(bounds, kind='stable'):
+            if bounds[i] >= best:
+                break
+            # a guess every candidate answers the same way teaches nothing
+            if sizes[i].max() == n:
+                continue
+
+            guess = int(guesses[i])
+            result = ft.feedback([guess], candidates)[0]
+            total, pending = n, bounds[i] - n
+
+            for r in np.flatnonzero(sizes[i]):
+                part = candidates[result == r]
+                pending -= lower_bound(len(part))
+                total += self.solve(part, played + (guess,), best - total - pending)
+                if total + pending >= best:
+                    break
+            else:
+                best, best_guess = total, guess
+
+        if best_guess is None:
+            self.bounds[key] = best
+        else:
+            self.memo[key] = (best, best_guess)
+        return best
+
+    def tree(self, candidates, played=()):
+        """returns the solved strategy for candidates as nested dicts"""
+        ft = self.ft
+        if len(candidates) <= 2:
+            guess = int(ft.rows[candidates[0]])
+        else:
+            self.solve(candidates, played)
+            guess = self.memo[candidates.tobytes()][1]
+
+        node = {'guess': decode(guess, ft.pegs, ft.colors)}
+        result = ft.feedback([guess], candidates)[0]
+        children = {}
+        for r in np.unique(result):
+            if r != ft.win:
+                children[feedback_key(r, ft.pegs)] = self.tree(candidates[result == r], played + (guess,))
+        if children:
+            node['children'] = children
+        return node
+
+
+def _init_worker(pegs, colors, duplicates, shared=None):
+    """
+    gives each worker its own memo, over the table the parent shared when
+    there is one
+    """
+    global _search
+    _search = Search(attach_table(shared) if shared else load_table(pegs, colors, duplicates))
+
+
+def _solve_branch(task):
+    """solves the candidates left after one first guess and feedback"""
+    guess, candidates = task
+    before = _search.nodes
+    total = _search.solve(candidates, (guess,))
+    return total, _search.tree(candidates, (guess,)), _search.nodes - before
+
+
+def depth(node):
+    """number of guesses along the longest path of a strategy tree"""
+    return 1 + max((depth(child) for child in node.get('children', {}).values()), default=0)
+
+
+def optimal_strategy(pegs=4, colors=6, duplicates=True, processes=None):
+    """
+    computes the optimal strategy tree for a game variant, returns
+    (tree, stats) where stats has the average guesses and search timings
+    """
+    start = time.perf_counter()
+    ft = load_table(pegs, colors, duplicates)
+    candidates = np.arange(len(ft))
+
+    # every first guess and feedback is a branch for the pool
+    firsts = representatives((), pegs, colors)
+    tasks, labels = [], []
+    for guess in firsts:
+        result = ft.feedback([guess], candidates)[0]
+        for r in np.unique(result):
+            if r != ft.win:
+                tasks.append((int(guess), candidates[result == r]))
+                labels.append((int(guess), feedback_key(r, pegs)))
+
+    processes = processes or multiprocessing.cpu_count()
+    if processes == 1:
+        _init_worker(pegs, colors, duplicates)
+        results = [_solve_branch(task) for task in tasks]
+    else:
+        # workers read the parent's table from shared memory rather than building their own
+        with shared_table(ft) as shared:
+            # workers are closed and joined, not terminated, terminate can't
+            # stop workers forked from a process with pygame's SIGTERM handler
+            pool = multiprocessing.Pool(processes, _init_worker, (pegs, colors, duplicates, shared))
+            try:
+                results = pool.map(_solve_branch, tasks)
+            finally:
+                pool.close()
+                pool.join()
+
+    totals = {int(guess): len(candidates) for guess in firsts}
+    trees = {int(guess): {} for guess in firsts}
+    for (guess, key), (total, subtree, _) in zip(labels, results):
+        totals[guess] += total
+        trees[guess][key] = subtree
+
+    best = min(totals, key=totals.get)
+    tree = {'guess': decode(best, pegs, colors), 'children': trees[best]}
+
+    stats = {
+        'pegs': pegs,
+        'colors': colors,
+        'duplicates': duplicates,
+        'secrets': len(candidates),
+        'total_guesses': int(totals[best]),
+        'average_guesses': totals[best] / len(candidates),
+        'max_guesses': depth(tree),
+        'nodes': int(sum(nodes for _, _, nodes in results)),
+        'branches': len(tasks),
+        'processes': processes,
+        'seconds': time.perf_counter() - start,
+    }
+    return tree, stats
+
+
+def dump_strategy(tree, stats, path):
+    """writes a strategy tree and its search stats as JSON"""
+    with open(path, 'w') as f:
+        json.dump({'stats': stats, 'tree': tree}, f)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Search for the optimal Mastermind strategy')
+    parser.add_argument('--pegs', type=int, default=4)
+    parser.add_argument('--colors', type=int, default=6)
+    parser.add_argument('--no-duplicates', action='store_true')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--out', default='strategy.json')
+    args = parser.parse_args()
+
+    tree, stats = optimal_strategy(args.pegs, args.colors, not args.no_duplicates, args.processes)
+    dump_strategy(tree, stats, args.out)
+    print(json.dumps(stats, indent=2))
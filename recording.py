@@ -0,0 +1,158 @@
+# Game Recording
+
+# Every guess played is appended to a binary log as one fixed width record,
+# holding the game's settings and secret alongside the guess, its packed
+# feedback and when it was played. Records are buffered and written in
+# blocks, and a log is loaded by memory mapping it as a NumPy record array,
+# so millions of games load without parsing anything record by record.
+#
+# Layout, little endian:
+#   header   one HEADER record, HEADER_SIZE bytes
+#   records  RECORD records, oldest first
+
+import atexit
+import os
+import time
+import numpy as np
+from book import cache_dir
+
+RECORD_VERSION = 1
+MAGIC = b'MMREC'
+HEADER_SIZE = 32
+
+HEADER = np.dtype([('magic', 'S8'), ('version', '<u4'), ('itemsize', '<u4')])
+
+# games, numbered guesses and packed feedback are as the solver keeps them
+RECORD = np.dtype([('game', '<u8'), ('time', '<f8'), ('secret', '<u4'), ('guess', '<u4'),
+                   ('move', 'u1'), ('result', 'u1'), ('pegs', 'u1'), ('colors', 'u1'),
+                   ('guesses', 'u1'), ('flags', 'u1'), ('source', 'u1'), ('players', 'u1')])
+
+# flags
+DUPLICATES = 1
+OVER = 2
+WIN = 4
+
+# sources
+TERMINAL = 0
+PYGAME = 1
+
+# records held before a write
+BUFFER = 4096
+
+
+def record_path():
+    """log both front ends record to unless told otherwise"""
+    return os.path.join(cache_dir(), 'games.bin')
+
+
+class Recorder:
+    """
+    Buffered writer appending records to a log. Games are told apart by
+    key while they are played, each first move starts a new game number.
+    """
+    def __init__(self, path, source=TERMINAL, buffer=BUFFER):
+        self.path = path
+        self.source = source
+        self.records = np.zeros(buffer, RECORD)
+        self.count = 0
+
+        # game numbers start from a random base so logs can be shared
+        self.base = int.from_bytes(os.urandom(4), 'little') << 32
+        self.games = 0
+        self.playing = {}
+
+    def record(self, key, secret, guess, move, result, pegs, colors, guesses, duplicates, players=1,
+               over=False, win=False):
+        """buffers one guess of the game identified by key"""
+        if move == 0:
+            self.games += 1
+            self.playing[key] = self.base + self.games
+        game = self.playing.pop(key) if over else self.playing.get(key)
+
+        if game is None:
+            # joined part way through a game, it can't be numbered
+            return
+
+        self.records[self.count] = (game, time.time(), secret, guess, move, result, pegs, colors, guesses,
+                                    DUPLICATES * duplicates | OVER * over | WIN * win, self.source, players)
+        self.count += 1
+        if self.count == len(self.records):
+            self.flush()
+
+    def forget(self, key):
+        """drops a game left unfinished, its later moves aren't recorded"""
+        self.playing.pop(key, None)
+
+    def __call__(self, event, game):
+        """observer recording a terminal game"""
+        if event == 'guess':
+            move = game.max_guesses - 2 - game.guess_counter
+            result = game.results[move]
+            win = result == game.pegs * (game.pegs + 1)
+            self.record(game, game.secret, game.guesses[move], move, result, game.pegs, len(game.colors),
+                        game.max_guesses, game.duplicates, game.players, win or game.guess_counter < 0, win)
+
+    def flush(self):
+        """appends the buffered records to the log"""
+        if not self.count:
+            return
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with open(self.path, 'ab') as f:
+            if f.tell() == 0:
+                header = np.zeros(1, HEADER)
+                header['magic'], header['version'], header['itemsize'] = MAGIC, RECORD_VERSION, RECORD.itemsize
+                f.write(header.tobytes().ljust(HEADER_SIZE, b'\0'))
+            f.write(self.records[:self.count].tobytes())
+        self.count = 0
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_recorder(path=None, source=TERMINAL, buffer=BUFFER):
+    """a recorder that is flushed when the program exits"""
+    recorder = Recorder(path or record_path(), source, buffer)
+    atexit.register(recorder.close)
+    return recorder
+
+
+def load(path=None):
+    """
+    memory maps a log, returns its records as a read only RECORD array, a
+    record cut short by a writer that stopped part way through is left off
+    """
+    path = path or record_path()
+    header = np.fromfile(path, HEADER, count=1)
+    if len(header) == 0 or header[0]['magic'] != MAGIC or header[0]['itemsize'] != RECORD.itemsize:
+        raise ValueError('{} is not a game recording'.format(path))
+
+    count = (os.path.getsize(path) - HEADER_SIZE) // RECORD.itemsize
+    if count == 0:
+        return np.zeros(0, RECORD)
+    return np.memmap(path, RECORD, 'r', HEADER_SIZE, (count,))
+
+
+def load_frame(path=None):
+    """loads a log as a pandas DataFrame, one row per guess"""
+    # pandas is slow to import and only needed here
+    import pandas as pd
+
+    records = load(path)
+    frame = pd.DataFrame({name: records[name] for name in RECORD.names})
+
+    black, white = np.divmod(records['result'], records['pegs'] + 1)
+    frame['black'], frame['white'] = black, white
+    for name, flag in (('duplicates', DUPLICATES), ('over', OVER), ('win', WIN)):
+        frame[name] = (records['flags'] & flag).astype(bool)
+    frame['time'] = pd.to_datetime(records['time'], unit='s')
+    return frame
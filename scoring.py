@@ -0,0 +1,104 @@
+# Batch Scoring
+
+# Scores many guesses against many secrets at once with NumPy. Codes are
+# integer coded: each code is read as a base `colors` number with the first
+# peg most significant, so for 4 pegs and 6 colors 'RRRR' is 0 and the last
+# code is 1295. Functions also accept codes already split into an (N, pegs)
+# array of color indices.
+
+import numpy as np
+
+
+def encode(codes, colors=6):
+    """numbers codes (or a single code) as base colors integers"""
+    codes = np.asarray(codes, dtype=np.intp)
+    return codes @ colors ** np.arange(codes.shape[-1] - 1, -1, -1)
+
+
+def decode(number, pegs=4, colors=6):
+    """returns the color indices of a numbered code"""
+    return [(number // colors ** p) % colors for p in range(pegs - 1, -1, -1)]
+
+
+def to_digits(numbers, pegs=4, colors=6):
+    """splits integer coded codes into an (N, pegs) array of color indices"""
+    numbers = np.asarray(numbers)
+    if numbers.ndim == 2:
+        return numbers.astype(np.uint8, copy=False)
+
+    powers = colors ** np.arange(pegs - 1, -1, -1)
+    return (numbers.reshape(-1, 1) // powers % colors).astype(np.uint8)
+
+
+def histogram(digits, colors=6):
+    """counts how many pegs of each color every code has"""
+    return np.stack([(digits == c).sum(axis=-1, dtype=np.uint8) for c in range(colors)], axis=-1)
+
+
+def pack(black, white, pegs=4):
+    """packs black and white counts into single feedback values"""
+    return (black * (pegs + 1) + white).astype(np.uint8)
+
+
+def unpack(result, pegs=4):
+    """splits packed feedback values back into black and white counts"""
+    return np.divmod(result, pegs + 1)
+
+
+def score_code(guess, secret, colors=6):
+    """
+    scores one guess against one secret, both sequences of color indices,
+    returns (black, white). Unmatched secret pegs are counted by color and
+    each unmatched guess peg takes one from its color's count, so this is
+    O(pegs + colors) with no searching
+    """
+    black = white = 0
+    unmatched = [0] * colors
+    missed = []
+    for g, s in zip(guess, secret):
+        if g == s:
+            black += 1
+        else:
+            unmatched[s] += 1
+            missed.append(g)
+
+    for g in missed:
+        if unmatched[g]:
+            unmatched[g] -= 1
+            white += 1
+
+    return black, white
+
+
+def score(guesses, secrets, pegs=4, colors=6, secret_hist=None):
+    """
+    scores every guess against every secret, returns (black, white) uint8
+    arrays of shape (len(guesses), len(secrets)), secret_hist can pass in
+    the secrets' histogram when it is already known
+    """
+    guesses = to_digits(guesses, pegs, colors)
+    secrets = to_digits(secrets, pegs, colors)
+    if secret_hist is None:
+        secret_hist = histogram(secrets, colors)
+
+    black = (guesses[:, None, :] == secrets[None, :, :]).sum(axis=2, dtype=np.uint8)
+
+    # colors matched regardless of position, black included
+    total = np.minimum(histogram(guesses, colors)[:, None, :],
+                       secret_hist[None, :, :]).sum(axis=2, dtype=np.uint8)
+
+    return black, total - black
+
+
+def score_pairs(guesses, secrets, pegs=4, colors=6):
+    """
+    scores guesses[i] against secrets[i] for every i, returns (black, white)
+    uint8 arrays of the same length
+    """
+    guesses = to_digits(guesses, pegs, colors)
+    secrets = to_digits(secrets, pegs, colors)
+
+    black = (guesses == secrets).sum(axis=1, dtype=np.uint8)
+    total = np.minimum(histogram(guesses, colors), histogram(secrets, colors)).sum(axis=1, dtype=np.uint8)
+
+    return black, total - black
@@ -0,0 +1,217 @@
+# Game Server
+
+# Hosts terminal games over TCP for any number of clients at once. Every
+# message is one line of JSON. Requests carry an "op" and get exactly one
+# reply, {"ok": true, ...} or {"ok": false, "error": "..."}:
+#   {"op": "new"}                                     play against the cpu
+#   {"op": "make", "solution": ["R", "B", "Y", "G"]}  codemaker sets a solution
+#   {"op": "join"} or {"op": "join", "game": 3}       codebreaker takes a made game
+#   {"op": "guess", "game": 3, "guess": ["R", "R", "B", "B"]}
+# new and make also take "duplicates", "pegs", "colors" (a string of color
+# letters) and "guesses", and new takes "evil" for a cpu codemaker that
+# never commits to a solution. A codemaker is sent {"event": ...} lines as the
+# codebreaker joins and plays, from the same events the game notifies.
+
+import argparse
+import asyncio
+import itertools
+import json
+from terminal_game import Game
+from recording import Recorder
+
+HOST = '127.0.0.1'
+PORT = 7654
+
+
+class GameServer:
+    """
+    Games being played, by id, and the connections playing them, every game
+    is recorded when there is a recorder
+    """
+    def __init__(self, recorder=None):
+        self.recorder = recorder
+        self.games = {}
+        # made games no codebreaker has joined yet, oldest first
+        self.waiting = {}
+        self.breakers = {}
+        self.makers = {}
+        # ids of the games each connection is playing, until they are dropped
+        self.owned = {}
+        self.ids = itertools.count(1)
+
+    async def handle(self, reader, writer):
+        """serves one connection until it closes"""
+        owned = self.owned[writer] = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    reply = self.request(json.loads(line), writer, owned)
+                except (ValueError, KeyError, TypeError, AttributeError, OverflowError) as e:
+                    reply = {'ok': False, 'error': str(e)}
+                send(writer, reply)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            for game_id in list(owned):
+                self.drop(game_id, writer)
+            del self.owned[writer]
+            writer.close()
+
+    def request(self, message, writer, owned):
+        """carries out one request, returns the reply"""
+        op = message.get('op')
+
+        if op == 'new':
+            game = self.create(message, 1)
+            game.create_solution()
+            game_id = next(self.ids)
+            self.games[game_id] = game
+            self.breakers[game_id] = writer
+            owned.add(game_id)
+            return settings(game_id, game)
+
+        if op == 'make':
+            game = self.create(message, 2)
+            solution = list(message['solution'])
+            check_code(game, solution)
+            if not game.duplicates and len(set(solution)) < len(solution):
+                raise ValueError('solution repeats a color')
+            game.solution = solution
+
+            game_id = next(self.ids)
+            game.subscribe(relay(game_id, writer))
+            self.games[game_id] = game
+            self.waiting[game_id] = game
+            self.makers[game_id] = writer
+            owned.add(game_id)
+            return settings(game_id, game)
+
+        if op == 'join':
+            game_id = message.get('game', next(iter(self.waiting), None))
+            if game_id not in self.waiting:
+                raise ValueError('no game waiting for a codebreaker')
+            game = self.waiting.pop(game_id)
+            self.breakers[game_id] = writer
+            owned.add(game_id)
+            game.notify('join')
+            return settings(game_id, game)
+
+        if op == 'guess':
+            game_id = message['game']
+            if self.breakers.get(game_id) is not writer:
+                raise ValueError('not playing game {}'.format(game_id))
+            game = self.games[game_id]
+            guess = list(message['guess'])
+            check_code(game, guess)
+
+            game.guess_row(guess)
+            reply = {'ok': True, 'game': game_id, 'left': game.guess_counter + 1, 'over': game.game_over,
+                     'win': game.player_win}
+            reply.update(last_row(game))
+            if game.game_over:
+                reply['solution'] = game.solution
+                self.drop(game_id)
+            return reply
+
+        raise ValueError('unknown op {!r}'.format(op))
+
+    def create(self, message, players):
+        """
+        a game with the settings asked for, raises ValueError for settings
+        a game or its recording can't hold
+        """
+        colors = message.get('colors')
+        pegs = int(message.get('pegs', 4))
+        guesses = int(message.get('guesses', 8))
+        if colors is not None and not isinstance(colors, str):
+            raise ValueError('colors are a string of color letters')
+        # recorded moves and color counts are single bytes, and packed
+        # feedback only has room for 15 pegs
+        if not 1 <= pegs <= 15 or not 1 <= guesses <= 255 or len(colors or '') > 255:
+            raise ValueError('expected 1 to 15 pegs, 1 to 255 guesses and at most 255 colors')
+
+        game = Game(players, bool(message.get('duplicates', True)), pegs, colors, guesses,
+                    players == 1 and bool(message.get('evil', False)))
+        if self.recorder is not None:
+            game.subscribe(self.recorder)
+        return game
+
+    def drop(self, game_id, writer=None):
+        """
+        forgets a game once it is over, or when writer disconnects from it,
+        telling whoever is left that the game has gone
+        """
+        game = self.games.pop(game_id, None)
+        self.waiting.pop(game_id, None)
+        if self.recorder is not None and game is not None:
+            self.recorder.forget(game)
+        for players in (self.breakers, self.makers):
+            other = players.pop(game_id, None)
+            self.owned.get(other, set()).discard(game_id)
+            if writer is not None and other is not None and other is not writer:
+                send(other, {'event': 'left', 'game': game_id})
+
+
+def settings(game_id, game):
+    """reply describing a game"""
+    return {'ok': True, 'game': game_id, 'duplicates': game.duplicates, 'pegs': game.pegs,
+            'colors': ''.join(game.colors), 'guesses': game.max_guesses}
+
+
+def last_row(game):
+    """the latest guess and its black and white counts"""
+    code, result = game.history()[-1]
+    black, white = divmod(result, game.pegs + 1)
+    return {'guess': game.decode(code), 'black': black, 'white': white}
+
+
+def check_code(game, code):
+    """raises ValueError unless code is pegs colors from the game"""
+    if len(code) != game.pegs or any(peg not in game.colors for peg in code):
+        raise ValueError('expected {} of {}'.format(game.pegs, ', '.join(game.colors)))
+
+
+def relay(game_id, writer):
+    """observer passing a codebreaker's moves on to the codemaker"""
+    def observer(event, game):
+        message = {'event': event, 'game': game_id}
+        if event == 'guess':
+            message.update(last_row(game))
+        send(writer, message)
+    return observer
+
+
+def send(writer, message):
+    """queues one JSON line, dropped if the connection is closing"""
+    if not writer.is_closing():
+        writer.write(json.dumps(message).encode() + b'\n')
+
+
+async def start(host=HOST, port=PORT, recorder=None):
+    """starts serving, returns the asyncio server"""
+    return await asyncio.start_server(GameServer(recorder).handle, host, port)
+
+
+async def serve_forever(host=HOST, port=PORT, recorder=None):
+    server = await start(host, port, recorder)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve Mastermind games over TCP')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--record', default=None, help='append every game to this recording')
+    args = parser.parse_args()
+
+    recorder = Recorder(args.record) if args.record else None
+    try:
+        asyncio.run(serve_forever(args.host, args.port, recorder))
+    finally:
+        if recorder is not None:
+            recorder.close()
@@ -1,8 +1,12 @@
+import os
 import pygame
 
 
 # CONSTANTS
 
+# target frames per second
+FPS = 30
+
 # window dimensions
 WINDOWWIDTH = 700
 WINDOWHEIGHT = 900
@@ -22,8 +26,14 @@ LEFTMARGIN = 150
 FBLEFTMARGIN = 475
 FBTOPMARGIN = 70
 
-# screen Surface
-SCREEN = pygame.display.set_mode((WINDOWWIDTH, WINDOWHEIGHT))
+# legend lines start here, below the last board row
+LEGENDTOP = WINDOWHEIGHT - 130
+
+# frame stats overlay, in the empty corner left of the legend
+OVERLAY = (0, WINDOWHEIGHT - 60, 145, 55)
+
+# screen Surface, created by init_display
+SCREEN = None
 
 # board dimensions
 ROWS = 9
@@ -43,17 +53,93 @@ BGCOLOR = (41, 60, 89)
 TEXT = (193, 201, 214)
 
 
-# GAME SCREENS/TEXT
-def start_screen():
-    # fonts
-    font_lg = pygame.font.Font('GamePlayed-vYL7.ttf', 70)
-    font_md = pygame.font.Font('GamePlayed-vYL7.ttf', 25)
-    font_sm = pygame.font.Font('GamePlayed-vYL7.ttf', 14)
+# font file, found next to this module whatever the working directory
+FONT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'GamePlayed-vYL7.ttf')
+
+
+# DISPLAY
+def init_display(headless=False):
+    """
+    creates the screen Surface, headless renders with SDL's dummy video
+    driver so no window is opened and no display server is needed
+    """
+    global SCREEN
+    if headless:
+        # a display already started, e.g. by pygame.init, keeps its driver
+        # unless it is shut down first
+        pygame.display.quit()
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    pygame.display.init()
+    SCREEN = pygame.display.set_mode((WINDOWWIDTH, WINDOWHEIGHT))
+
+    # tile images are converted to the new screen's pixel format
+    _tiles.clear()
+    return SCREEN
+
+
+def get_screen():
+    """returns the screen Surface, None before init_display"""
+    return SCREEN
+
+
+# TEXT CACHE
+# fonts by size and rendered text by (text, size, color, underline), so
+# screens are drawn with blits instead of re-rendering glyphs every frame
+_fonts = {}
+_text = {}
+
 
-    color = TEXT
+def get_font(size):
+    """returns the game font at a size, loaded once"""
+    if size not in _fonts:
+        _fonts[size] = pygame.font.Font(FONT, size)
+    return _fonts[size]
+
+
+def render_text(text, size, color=TEXT, underline=False):
+    """returns rendered text, cached by (text, size, color, underline)"""
+    key = (text, size, color, underline)
+    if key not in _text:
+        font = get_font(size)
+        font.set_underline(underline)
+        _text[key] = font.render(text, True, color)
+        font.set_underline(False)
+    return _text[key]
+
+
+def clear_text_cache():
+    """drops cached fonts and text, e.g. after pygame.font is re-initialized"""
+    _fonts.clear()
+    _text.clear()
+
+
+# TILE ATLAS
+# one pre-rendered image per (color, size, border), shared by every tile
+# showing it, so tiles change color by swapping images rather than filling
+_tiles = {}
+
+
+def tile_image(color, size, border=False):
+    """returns the shared image of a tile, bordered tiles have a black edge"""
+    key = (color, size, border)
+    if key not in _tiles:
+        image = pygame.Surface((size, size))
+        image.fill(color)
+        if border:
+            pygame.draw.rect(image, BLACK, image.get_rect(), max(2, size // 20))
+        if pygame.display.get_surface() is not None:
+            image = image.convert()
+        _tiles[key] = image
+    return _tiles[key]
+
+
+# GAME SCREENS/TEXT
+def start_screen(pegs=COLUMNS, colors=6, duplicates=False):
+    # text sizes
+    lg, md, sm = 70, 25, 14
 
     # display title
-    title = font_lg.render('MASTERMIND', True, color)
+    title = render_text('MASTERMIND', lg)
     title_rect = title.get_rect(center=(WINDOWWIDTH / 2, WINDOWHEIGHT / 14))
     SCREEN.blit(title, title_rect)
 
@@ -62,146 +148,115 @@ def start_screen():
     x_buffer = 40
 
     # rules title
-    font_md.set_underline(True)
-    rule_title = font_md.render('Rules:', True, color)
+    rule_title = render_text('Rules:', md, underline=True)
     rule_title_rect = rule_title.get_rect(center=(title_rect.bottomleft[0] - x_buffer,
                                                   title_rect.bottomleft[1] + y_buffer))
     SCREEN.blit(rule_title, rule_title_rect)
 
-    # rule 1
-    rule_1 = font_sm.render('- Objective of the game is to guess the 4 color solution '
-                            'generated by the CPU', True, color)
-
-    rule_1_rect = rule_1.get_rect(topleft=(rule_title_rect.center[0] - x_buffer,
-                                           rule_title_rect.center[1] + y_buffer))
-    SCREEN.blit(rule_1, rule_1_rect)
-
-    # rule 2
-    rule_2 = font_sm.render('- Select from 6 color tiles to guess the correct solution', True, color)
-    rule_2_rect = rule_2.get_rect(topleft=(rule_1_rect.bottomleft[0],
-                                           rule_1_rect.bottomleft[1] + y_buffer))
-    SCREEN.blit(rule_2, rule_2_rect)
-
-    # rule 3
-    rule_3 = font_sm.render('- If guess is correct color in correct position, a black tile will '
-                            'be displayed', True, color)
-
-    rule_3_rect = rule_3.get_rect(topleft=(rule_2_rect.bottomleft[0],
-                                           rule_2_rect.bottomleft[1] + y_buffer))
-    SCREEN.blit(rule_3, rule_3_rect)
-
-    # rule 4
-    rule_4 = font_sm.render('- If guess is correct color in incorrect position, a white tile will '
-                            'be displayed', True, color)
-    rule_4_rect = rule_4.get_rect(topleft=(rule_3_rect.bottomleft[0],
-                                           rule_3_rect.bottomleft[1] + y_buffer))
-    SCREEN.blit(rule_4, rule_4_rect)
-
-    # rule 5
-    rule_5 = font_sm.render('- Use up and down arrow keys to select color and right and left to'
-                            'select column', True, color)
-    rule_5_rect = rule_5.get_rect(topleft=(rule_4_rect.bottomleft[0],
-                                           rule_4_rect.bottomleft[1] + y_buffer))
-    SCREEN.blit(rule_5, rule_5_rect)
-
-    # rule 6
-    rule_6 = font_sm.render('- There will be no duplicate colors in the solution', True, color)
-    rule_6_rect = rule_6.get_rect(topleft=(rule_5_rect.bottomleft[0],
-                                           rule_5_rect.bottomleft[1] + y_buffer))
-    SCREEN.blit(rule_6, rule_6_rect)
-
-    # rule 7
-    rule_7 = font_sm.render('- Press [ENTER] to submit guessed row', True, color)
-    rule_7_rect = rule_7.get_rect(topleft=(rule_6_rect.bottomleft[0],
-                                           rule_6_rect.bottomleft[1] + y_buffer))
-    SCREEN.blit(rule_7, rule_7_rect)
-
-    # rule 8
-    rule_8 = font_sm.render('- Press [N] to reset at any time', True, color)
-    rule_8_rect = rule_8.get_rect(topleft=(rule_7_rect.bottomleft[0],
-                                           rule_7_rect.bottomleft[1] + y_buffer))
-    SCREEN.blit(rule_8, rule_8_rect)
+    rules = ['- Objective of the game is to guess the {} color solution generated by the CPU'.format(pegs),
+             '- Select from {} color tiles to guess the correct solution'.format(colors),
+             '- If guess is correct color in correct position, a black tile will be displayed',
+             '- If guess is correct color in incorrect position, a white tile will be displayed',
+             '- Use up and down arrow keys to select color and right and left to select column',
+             '- There may be duplicate colors in the solution' if duplicates else
+             '- There will be no duplicate colors in the solution',
+             '- Press [ENTER] to submit guessed row',
+             '- Press [N] to reset at any time']
+
+    # rule 1 hangs off the rules title, each later rule off the one before
+    rule = render_text(rules[0], sm)
+    rule_rect = rule.get_rect(topleft=(rule_title_rect.center[0] - x_buffer,
+                                       rule_title_rect.center[1] + y_buffer))
+    SCREEN.blit(rule, rule_rect)
+
+    for text in rules[1:]:
+        rule = render_text(text, sm)
+        rule_rect = rule.get_rect(topleft=(rule_rect.bottomleft[0], rule_rect.bottomleft[1] + y_buffer))
+        SCREEN.blit(rule, rule_rect)
 
     # begin
-    begin = font_md.render('PRESS [SPACE] TO BEGIN', True, color)
-    begin_rect = begin.get_rect(topleft=(rule_8_rect.bottomleft[0],
-                                         rule_8_rect.bottomleft[1] + y_buffer))
+    begin = render_text('PRESS [SPACE] TO BEGIN', md, underline=True)
+    begin_rect = begin.get_rect(topleft=(rule_rect.bottomleft[0],
+                                         rule_rect.bottomleft[1] + y_buffer))
 
     SCREEN.blit(begin, begin_rect)
 
 
 def finish_screen(outcome):
-    # fonts
-    font_lg = pygame.font.Font('GamePlayed-vYL7.ttf', 70)
-    font_md = pygame.font.Font('GamePlayed-vYL7.ttf', 25)
-
-    color = TEXT
+    # text sizes
+    lg, md = 70, 25
 
     # player win
     if outcome == 'p':
-        congrats = font_lg.render('CONGRATULATIONS!!', True, color)
+        congrats = render_text('CONGRATULATIONS!!', lg)
         congrats_rect = congrats.get_rect(center=(WINDOWWIDTH/2, WINDOWHEIGHT/5))
         SCREEN.blit(congrats, congrats_rect)
 
-        you_won = font_lg.render('YOU WON!!', True, color)
+        you_won = render_text('YOU WON!!', lg)
         you_won_rect = you_won.get_rect(center=(WINDOWWIDTH / 2, (WINDOWHEIGHT / 5) + 150))
         SCREEN.blit(you_won, you_won_rect)
 
     # cpu win
     if outcome == 'c':
-        sorry = font_lg.render('SORRY :(', True, color)
+        sorry = render_text('SORRY :(', lg)
         sorry_rect = sorry.get_rect(center=(WINDOWWIDTH / 2, WINDOWHEIGHT / 5))
         SCREEN.blit(sorry, sorry_rect)
 
-        you_lost = font_lg.render('YOU LOST', True, color)
+        you_lost = render_text('YOU LOST', lg)
         you_lost_rect = you_lost.get_rect(center=(WINDOWWIDTH / 2, (WINDOWHEIGHT / 5) + 150))
         SCREEN.blit(you_lost, you_lost_rect)
 
-    play_again = font_md.render('PLAY AGAIN??', True, color)
+    play_again = render_text('PLAY AGAIN??', md)
     play_again_rect = play_again.get_rect(center=(WINDOWWIDTH / 2, (WINDOWHEIGHT / 5) + 250))
     SCREEN.blit(play_again, play_again_rect)
 
-    press_enter = font_md.render('Press [SPACE] to play again', True, color)
+    press_enter = render_text('Press [SPACE] to play again', md)
     press_enter_rect = press_enter.get_rect(center=(WINDOWWIDTH / 2, (WINDOWHEIGHT / 5) + 350))
     SCREEN.blit(press_enter, press_enter_rect)
 
 
-def main_legend():
-    font_sm = pygame.font.Font('GamePlayed-vYL7.ttf', 14)
-
-    color = TEXT
-
-    # legend 1
-    legend_1 = font_sm.render('White Tile = correct color in wrong position', True, color)
-    legend_1_rect = legend_1.get_rect(topleft=(150, WINDOWHEIGHT - 130))
-    SCREEN.blit(legend_1, legend_1_rect)
-
-    # legend 2
-    legend_2 = font_sm.render('Black Tile = correct color in correct position', True, color)
-    legend_2_rect = legend_2.get_rect(topleft=(legend_1_rect.bottomleft[0],
-                                               legend_1_rect.bottomleft[1]))
-    SCREEN.blit(legend_2, legend_2_rect)
-
-    # legend 3
-    legend_3 = font_sm.render('Order of feedback tiles do not correspond to  main tiles', True, color)
-    legend_3_rect = legend_3.get_rect(topleft=(legend_2_rect.bottomleft[0],
-                                               legend_2_rect.bottomleft[1]))
-    SCREEN.blit(legend_3, legend_3_rect)
-
-    # legend 3
-    legend_3 = font_sm.render('Order of feedback tiles do not correspond to  main tiles', True, color)
-    legend_3_rect = legend_3.get_rect(topleft=(legend_2_rect.bottomleft[0],
-                                               legend_2_rect.bottomleft[1]))
-    SCREEN.blit(legend_3, legend_3_rect)
-
-    # legend 4
-    legend_4 = font_sm.render('There are no duplicates in the solution', True, color)
-    legend_4_rect = legend_4.get_rect(topleft=(legend_3_rect.bottomleft[0],
-                                               legend_3_rect.bottomleft[1]))
-    SCREEN.blit(legend_4, legend_4_rect)
-
-    # legend 5
-    legend_5 = font_sm.render('Press [N] at any time to begin a new game', True, color)
-    legend_5_rect = legend_5.get_rect(topleft=(legend_4_rect.bottomleft[0],
-                                               legend_4_rect.bottomleft[1]))
-    SCREEN.blit(legend_5, legend_5_rect)
+def main_legend(duplicates=False):
+    legends = ['White Tile = correct color in wrong position',
+               'Black Tile = correct color in correct position',
+               'Order of feedback tiles do not correspond to  main tiles',
+               'There may be duplicates in the solution' if duplicates else
+               'There are no duplicates in the solution',
+               'Press [N] at any time to begin a new game',
+               'Press [H] for a hint']
+
+    # legend lines stacked from the bottom left of the board
+    top = LEGENDTOP
+    for text in legends:
+        legend = render_text(text, 14)
+        legend_rect = legend.get_rect(topleft=(150, top))
+        SCREEN.blit(legend, legend_rect)
+        top = legend_rect.bottom
+
+
+def hint_panel(colors, candidates, top):
+    """
+    draws a suggested guess and the number of solutions left in the margin
+    left of the board, returns the screen rect it covers
+    """
+    rect = SCREEN.fill(BGCOLOR, (0, top, LEFTMARGIN - 5, TILESIZE))
+    step = (rect.width - 10) // max(len(colors), 4)
+    for j, color in enumerate(colors):
+        SCREEN.blit(tile_image(color, min(FBSIZE, step - 5)), (rect.left + 10 + step * j, top))
+
+    left = render_text('{} LEFT'.format(candidates), 14)
+    SCREEN.blit(left, (rect.left + 10, top + FBSIZE + 10))
+    return rect
+
+
+def stats_overlay(lines):
+    """draws the frame stats overlay, returns the screen rect it covers"""
+    rect = SCREEN.fill(BGCOLOR, OVERLAY)
+    font = get_font(14)
+
+    # numbers change every frame so the lines aren't cached
+    top = rect.top
+    for text in lines:
+        line = font.render(text, True, TEXT)
+        SCREEN.blit(line, (rect.left + 5, top))
+        top += font.get_linesize()
+    return rect
@@ -0,0 +1,99 @@
+# Headless Simulation
+
+# Plays many games with no printing and reports how a strategy did and how
+# fast the games ran. A strategy is any function taking a Game and returning
+# its next guess as a list of colors.
+
+import argparse
+import json
+import random
+import time
+from collections import Counter
+from scoring import decode
+from terminal_game import Game
+from recording import Recorder
+
+
+def knuth(game):
+    """knuth's minimax guess"""
+    return game.next_guess()
+
+
+def consistent(game):
+    """a random guess that could still be the solution"""
+    candidates = game.get_candidates()
+    code = int(candidates.ft.rows[random.choice(candidates.indices())])
+    return [game.colors[x] for x in decode(code, game.pegs, len(game.colors))]
+
+
+def sampled(budget_ms):
+    """the time budgeted sampled solver"""
+    def strategy(game):
+        return game.next_guess(budget_ms)
+    return strategy
+
+
+STRATEGIES = {'knuth': knuth, 'consistent': consistent}
+
+
+def play(game, strategy):
+    """plays one game to the end, returns the number of guesses made"""
+    while not game.game_over:
+        game.guess_row(strategy(game))
+    return game.max_guesses - 1 - game.guess_counter
+
+
+def run(games=1000, strategy=knuth, duplicates=True, pegs=4, colors=None, guesses=8, seed=None, observer=None):
+    """
+    plays games against random solutions, returns stats with the win rate,
+    the guesses each game took and games played per second
+    """
+    if seed is not None:
+        random.seed(seed)
+
+    played = Counter()
+    wins = 0
+    start = time.perf_counter()
+
+    for _ in range(games):
+        game = Game(1, duplicates, pegs, colors, guesses)
+        if observer is not None:
+            game.subscribe(observer)
+        game.create_solution()
+
+        played[play(game, strategy)] += 1
+        wins += game.player_win
+
+    seconds = time.perf_counter() - start
+    total = sum(n * count for n, count in played.items())
+    return {
+        'games': games,
+        'wins': wins,
+        'win_rate': wins / games,
+        'average_guesses': total / games,
+        'guesses': dict(sorted(played.items())),
+        'seconds': seconds,
+        'games_per_sec': games / seconds,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Simulate Mastermind games headlessly')
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--strategy', choices=sorted(STRATEGIES) + ['sampled'], default='knuth')
+    parser.add_argument('--budget-ms', type=float, default=20)
+    parser.add_argument('--pegs', type=int, default=4)
+    parser.add_argument('--colors', default='RBYGWO')
+    parser.add_argument('--guesses', type=int, default=8)
+    parser.add_argument('--no-duplicates', action='store_true')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--record', default=None, help='append every game to this recording')
+    args = parser.parse_args()
+
+    chosen = sampled(args.budget_ms) if args.strategy == 'sampled' else STRATEGIES[args.strategy]
+    recorder = Recorder(args.record) if args.record else None
+    stats = run(args.games, chosen, not args.no_duplicates, args.pegs, args.colors, args.guesses, args.seed,
+                recorder)
+    if recorder is not None:
+        recorder.close()
+    print(json.dumps(stats, indent=2))
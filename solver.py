@@ -0,0 +1,255 @@
+# Mastermind Solver
+
+# Codes are rows of color indices. Every code is also numbered by reading it
+# as a base `colors` integer, most significant peg first, which is its row in
+# the feedback table. A feedback result is packed into a single integer
+# black * (pegs + 1) + white so a whole table fits in uint8.
+
+import math
+import time
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+import numpy as np
+from scoring import encode, histogram, pack, score, to_digits
+from symmetry import representatives
+
+# feedback tables and opening guesses, keyed by (pegs, colors, duplicates)
+_tables = {}
+_openings = {}
+
+# shared memory blocks attached by this process, open while their table is used
+_shared = {}
+
+# largest guess x secret table kept in memory (1296 x 1296 is ~1.7M cells)
+TABLE_LIMIT = 1 << 22
+
+# guess x secret cells scored at once when there is no table
+CHUNK_CELLS = 1 << 20
+
+# candidates a sampled guess is judged against, and cells scored per batch
+SAMPLE_SECRETS = 500
+SAMPLE_CELLS = 1 << 17
+
+
+def code_space(pegs=4, colors=6, duplicates=True):
+    """returns every valid code as an (N, pegs) array of color indices"""
+    codes = to_digits(np.arange(colors ** pegs), pegs, colors)
+    if not duplicates:
+        codes = codes[histogram(codes, colors).max(axis=1) <= 1]
+    return codes
+
+
+def table_fits(pegs=4, colors=6, duplicates=True):
+    """true when a variant's whole feedback table stays under TABLE_LIMIT"""
+    secrets = colors ** pegs if duplicates else math.perm(colors, pegs)
+    return colors ** pegs * secrets <= TABLE_LIMIT
+
+
+def feedback_slots(pegs):
+    """number of distinct packed feedback values for a given peg count"""
+    return (pegs + 1) ** 2
+
+
+def win_feedback(pegs):
+    """packed feedback value of an all black result"""
+    return pegs * (pegs + 1)
+
+
+class FeedbackTable:
+    """
+    Feedback of every guess against every valid secret. Small variants keep
+    the whole table in memory, larger ones score on demand in chunks so
+    memory stays bounded no matter how big the code space is.
+    """
+    def __init__(self, pegs=4, colors=6, duplicates=True, table=None):
+        self.pegs = pegs
+        self.colors = colors
+        self.duplicates = duplicates
+        self.slots = feedback_slots(pegs)
+        self.win = win_feedback(pegs)
+
+        # any code may be guessed, only valid codes may be secrets
+        self.guesses = colors ** pegs
+        self.codes = code_space(pegs, colors, duplicates)
+        self.rows = encode(self.codes, colors)
+        self.hist = histogram(self.codes, colors)
+
+        self.table = table
+        if table is None and table_fits(pegs, colors, duplicates):
+            self.table = self.feedback(np.arange(self.guesses), np.arange(len(self.codes)))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def column(self, code):
+        """returns the secret column of a numbered code, or None"""
+        column = np.searchsorted(self.rows, code)
+        if column < len(self.rows) and self.rows[column] == code:
+            return int(column)
+        return None
+
+    def feedback(self, guesses, columns):
+        """packed feedback of numbered guesses (rows) against secret columns"""
+        if self.table is not None:
+            return self.table[np.ix_(guesses, columns)]
+        return pack(*score(guesses, self.codes[columns], self.pegs, self.colors, self.hist[columns]),
+                    self.pegs)
+
+    def partitions(self, candidates, guesses=None):
+        """
+        yields (guesses, sizes) chunks, where sizes counts how many of the
+        candidates fall into each feedback for every guess in the chunk
+        """
+        if guesses is None:
+            guesses = np.arange(self.guesses)
+
+        step = max(1, CHUNK_CELLS // max(1, len(candidates)))
+        for start in range(0, len(guesses), step):
+            chunk = guesses[start:start + step]
+            result = self.feedback(chunk, candidates).astype(np.intp)
+            result += np.arange(len(chunk))[:, None] * self.slots
+            sizes = np.bincount(result.ravel(), minlength=len(chunk) * self.slots)
+            yield chunk, sizes.reshape(len(chunk), self.slots)
+
+
+def load_table(pegs=4, colors=6, duplicates=True):
+    """returns the FeedbackTable for a game variant, built once and cached"""
+    key = (pegs, colors, duplicates)
+    if key not in _tables:
+        _tables[key] = FeedbackTable(pegs, colors, duplicates)
+    return _tables[key]
+
+
+def use_table(pegs, colors, duplicates, table):
+    """makes a variant use an already built table, e.g. one mapped from disk"""
+    key = (pegs, colors, duplicates)
+    if key in _tables:
+        _tables[key].table = table
+    else:
+        _tables[key] = FeedbackTable(pegs, colors, duplicates, table)
+
+
+@contextmanager
+def shared_table(ft):
+    """
+    copies a materialized table into shared memory for the with block,
+    yields the spec other processes pass to attach_table, or None when ft
+    has no table to share
+    """
+    if ft.table is None:
+        yield None
+        return
+
+    shm = shared_memory.SharedMemory(create=True, size=max(1, ft.table.nbytes))
+    try:
+        np.ndarray(ft.table.shape, np.uint8, shm.buf)[:] = ft.table
+        yield shm.name, ft.table.shape, ft.pegs, ft.colors, ft.duplicates
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def attach_table(spec):
+    """
+    makes this process use a table published by shared_table, read only
+    and without copying it, returns the variant's FeedbackTable
+    """
+    name, shape, pegs, colors, duplicates = spec
+    shm = shared_memory.SharedMemory(name)
+    table = np.ndarray(shape, np.uint8, shm.buf)
+    table.flags.writeable = False
+
+    _shared[(pegs, colors, duplicates)] = shm
+    use_table(pegs, colors, duplicates, table)
+    return load_table(pegs, colors, duplicates)
+
+
+def opening_guess(pegs=4, colors=6, duplicates=True):
+    """returns the cached knuth first guess for a game variant"""
+    key = (pegs, colors, duplicates)
+    if key not in _openings:
+        ft = load_table(pegs, colors, duplicates)
+        _openings[key] = knuth_guess(ft, np.arange(len(ft)), representatives((), pegs, colors))
+    return _openings[key]
+
+
+def knuth_guess(ft, candidates, guesses=None):
+    """
+    Knuth's minimax rule: pick the guess whose largest feedback partition of
+    the remaining candidates is smallest, preferring guesses that could
+    still be the solution, then the lowest code. guesses limits the search
+    to some numbered codes, by default every code is tried
+    """
+    candidates = np.asarray(candidates)
+    if len(candidates) <= 2:
+        return int(ft.rows[candidates[0]])
+
+    if guesses is None:
+        guesses = np.arange(ft.guesses)
+    worst = np.concatenate([sizes.max(axis=1) for _, sizes in ft.partitions(candidates, guesses)])
+
+    best = guesses[worst == worst.min()]
+    in_candidates = np.isin(best, ft.rows[candidates])
+    if in_candidates.any():
+        return int(best[in_candidates][0])
+    return int(best[0])
+
+
+def sampled_guess(ft, candidates, budget_ms=50, rng=None):
+    """
+    anytime guess for variants too big for knuth: scores batches of random
+    guesses against a random sample of the candidates until budget_ms runs
+    out, returning the guess with the smallest expected partition seen
+    """
+    deadline = time.perf_counter() + budget_ms / 1000
+    rng = rng or np.random.default_rng()
+
+    candidates = np.asarray(candidates)
+    if len(candidates) <= 2:
+        return int(ft.rows[candidates[0]])
+
+    secrets = candidates
+    if len(candidates) > SAMPLE_SECRETS:
+        secrets = rng.choice(candidates, SAMPLE_SECRETS, replace=False)
+    batch = max(2, SAMPLE_CELLS // len(secrets))
+
+    best, best_score = None, None
+    while best is None or time.perf_counter() < deadline:
+        # half could still be the solution, half from the whole code space
+        guesses = np.concatenate([ft.rows[rng.choice(candidates, batch // 2)],
+                                  rng.integers(0, ft.guesses, batch - batch // 2)])
+
+        for chunk, sizes in ft.partitions(secrets, guesses):
+            # a guess that wins leaves nothing behind
+            sizes[:, ft.win] = 0
+            scores = (sizes ** 2).sum(axis=1)
+
+            i = scores.argmin()
+            if best is None or scores[i] < best_score:
+                best, best_score = int(chunk[i]), scores[i]
+
+    return best
+
+
+def filter_candidates(ft, candidates, guess, result):
+    """keeps the candidates that would have given result for guess"""
+    candidates = np.asarray(candidates)
+    return candidates[ft.feedback([guess], candidates)[0] == result]
+
+
+def knuth_solve(ft, secret, first=None):
+    """plays knuth's algorithm against a secret column, returns guesses made"""
+    candidates = np.arange(len(ft))
+    guesses = []
+
+    while True:
+        if first is not None and not guesses:
+            guess = first
+        else:
+            guess = knuth_guess(ft, candidates, representatives(guesses, ft.pegs, ft.colors))
+        guesses.append(guess)
+
+        result = ft.feedback([guess], [secret])[0, 0]
+        if result == ft.win:
+            return guesses
+        candidates = filter_candidates(ft, candidates, guess, result)
@@ -0,0 +1,116 @@
+# Guess Symmetry Reduction
+
+# Permuting peg positions and recoloring codes doesn't change feedback, so
+# any (position, color) permutation that leaves every guess played so far
+# untouched also leaves the consistent candidates untouched. Two guesses
+# related by such a permutation split the candidates the same way, so a
+# solver only needs to look at one guess out of each class.
+
+import functools
+import itertools
+import numpy as np
+from scoring import encode, to_digits
+
+
+def color_maps(played, pegs=4, colors=6):
+    """
+    yields (positions, lut) for every position permutation that some
+    recoloring lut maps each played guess back onto itself, lut is -1 for
+    colors no guess has used yet, which stay free to swap among themselves
+    """
+    played = [list(code) for code in to_digits(played, pegs, colors)] if len(played) else []
+
+    for positions in itertools.permutations(range(pegs)):
+        lut = np.full(colors, -1)
+        valid = True
+        for guess in played:
+            for i in range(pegs):
+                old, new = guess[positions[i]], guess[i]
+                if lut[old] == -1 and new not in lut:
+                    lut[old] = new
+                elif lut[old] != new:
+                    valid = False
+                    break
+            if not valid:
+                break
+
+        if valid:
+            yield positions, lut
+
+
+def canonical(guesses, played=(), pegs=4, colors=6):
+    """
+    returns the smallest numbered code each guess can be moved to without
+    disturbing the played guesses, equal values mean equivalent guesses
+    """
+    codes = to_digits(guesses, pegs, colors)
+    best = None
+
+    for positions, lut in color_maps(played, pegs, colors):
+        moved = codes[:, positions]
+        free = lut == -1
+        free_colors = np.flatnonzero(free)
+        out = lut[moved]
+
+        # free colors are relabeled smallest first in order of appearance
+        taken = np.zeros(len(codes), dtype=np.intp)
+        for i in range(pegs):
+            color = moved[:, i]
+            label = np.full(len(codes), -1)
+            for j in range(i):
+                label = np.where(moved[:, j] == color, out[:, j], label)
+
+            new = free[color] & (label == -1)
+            label[new] = free_colors[taken[new]]
+            taken += new
+            out[:, i] = np.where(free[color], label, out[:, i])
+
+        numbered = encode(out, colors)
+        best = numbered if best is None else np.minimum(best, numbered)
+
+    return best
+
+
+def representatives(played=(), pegs=4, colors=6):
+    """returns one numbered guess from every class of equivalent guesses"""
+    return _representatives(tuple(sorted(set(int(x) for x in played))), pegs, colors)
+
+
+@functools.lru_cache(maxsize=4096)
+def _representatives(played, pegs, colors):
+    """cached by played guesses, the order they were played doesn't matter"""
+    if not played:
+        # nothing is fixed yet, a class is just how many pegs share a color
+        codes = []
+        for counts in _partitions(pegs, min(pegs, colors)):
+            codes.append([c for c, count in enumerate(counts) for _ in range(count)])
+        reps = np.sort(encode(codes, colors))
+
+    elif _only_identity(played, pegs, colors):
+        reps = np.arange(colors ** pegs)
+
+    else:
+        reps = np.unique(canonical(np.arange(colors ** pegs), played, pegs, colors))
+
+    reps.setflags(write=False)
+    return reps
+
+
+def _only_identity(played, pegs, colors):
+    """true when every symmetry has been broken by the played guesses"""
+    maps = color_maps(played, pegs, colors)
+    positions, lut = next(maps)
+    return (lut != -1).all() and next(maps, None) is None
+
+
+def _partitions(total, parts, largest=None):
+    """yields ways to split total into at most parts counts, largest first"""
+    largest = total if largest is None else largest
+    if total == 0:
+        yield []
+        return
+    if parts == 0:
+        return
+    for count in range(min(total, largest), 0, -1):
+        for rest in _partitions(total - count, parts - 1, count):
+            yield [count] + rest
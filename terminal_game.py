@@ -8,29 +8,138 @@
 # A white peg means that a correct color was used but is in the wrong position
 # A black peg means that both the color and the position are correct
 
+import array
 import pprint
-import numpy as np
 import random
-import pygame
-import sys
+from scoring import decode, score_code
+from solver import opening_guess, knuth_guess, sampled_guess, table_fits
+from candidates import CandidateSet
+from symmetry import representatives
+from optimal import optimal_strategy
+from book import load_book
+from recording import open_recorder
+
+
+# Colors: R = red, B = blue, Y = yellow, G = green, W = white, O = orange
+COLORS = ('R', 'B', 'Y', 'G', 'W', 'O')
 
 
 class Game:
-    """Mastermind game class"""
-    def __init__(self, players, duplicates):
-        self.board = [(['' for x in range(4)], []) for y in range(8)]
-
-        # Colors: R = red, B = blue, Y = yellow, G = green, W = white, O = orange
-        self.colors = ['R', 'B', 'Y', 'G', 'W', 'O']
-        self.solution = []
-        self.guess_counter = 7
+    """
+    Mastermind game class. Guesses and the solution are kept as base
+    len(colors) integers and feedback as packed black * (pegs + 1) + white
+    bytes in arrays sized for the whole game, the board of color letters is
+    only built when asked for.
+    """
+    __slots__ = ('players', 'duplicates', 'pegs', 'colors', 'max_guesses', 'secret', 'guess_counter',
+                 'guesses', 'results', 'game_over', 'player_win', 'comp_p2_win', 'observers', '_candidates',
+                 'evil')
+
+    def __init__(self, players, duplicates, pegs=4, colors=None, guesses=8, evil=False):
+        colors = tuple(colors) if colors else COLORS
+        if len(set(colors)) < len(colors):
+            raise ValueError('colors repeat')
+        if pegs < 1 or guesses < 1:
+            raise ValueError('a game needs at least one peg and one guess')
+        if not duplicates and pegs > len(colors):
+            raise ValueError('{} pegs need duplicates with {} colors'.format(pegs, len(colors)))
+        # feedback is kept as bytes and codes as unsigned 32 bit ints, the peg
+        # bound goes first so a huge peg count never reaches the power
+        if pegs * (pegs + 1) > 255 or len(colors) ** pegs >= 1 << 32:
+            raise ValueError('{} pegs of {} colors is too many codes'.format(pegs, len(colors)))
+        # an evil codemaker scores every candidate each guess, too slow without a feedback table
+        if evil and not table_fits(pegs, len(colors), duplicates):
+            raise ValueError('an evil codemaker only plays variants small enough for a feedback table')
+
         self.players = players
         self.duplicates = duplicates
-        self.colors_seen = []
-        self.colors_in_sol = []
+        self.pegs = pegs
+        self.colors = colors
+        self.max_guesses = guesses
+        self.secret = None
+        self.guess_counter = guesses - 1
+
+        # numbered guesses and packed feedback, in the order played
+        self.guesses = array.array('I', bytes(4 * guesses))
+        self.results = bytearray(guesses)
+
         self.game_over = False
         self.player_win = False
         self.comp_p2_win = False
+        self.observers = ()
+        self._candidates = None
+
+        # an evil codemaker never commits to a solution, each guess gets the
+        # feedback leaving the most solutions possible
+        self.evil = evil
+
+    def __getstate__(self):
+        # observers belong to whoever is watching, candidates are rebuilt
+        return {name: getattr(self, name) for name in self.__slots__
+                if name not in ('observers', '_candidates')}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self.observers = ()
+        self._candidates = None
+
+    def copy(self):
+        """returns an independent copy of the game, sharing its observers"""
+        other = Game.__new__(Game)
+        for name in self.__slots__:
+            setattr(other, name, getattr(self, name))
+        other.guesses = array.array('I', self.guesses)
+        other.results = bytearray(self.results)
+        if self._candidates is not None:
+            other._candidates = self._candidates.copy()
+        return other
+
+    def subscribe(self, observer):
+        """registers observer(event, game) for 'guess', 'win' and 'lose' events"""
+        self.observers += (observer,)
+
+    def notify(self, event):
+        """passes a game event on to every observer"""
+        for observer in self.observers:
+            observer(event, self)
+
+    def encode(self, guess):
+        """numbers a list of color letters"""
+        code = 0
+        for peg in guess:
+            code = code * len(self.colors) + self.colors.index(peg)
+        return code
+
+    def decode(self, code):
+        """returns the color letters of a numbered code"""
+        return [self.colors[i] for i in decode(code, self.pegs, len(self.colors))]
+
+    @property
+    def solution(self):
+        return self.decode(self.secret) if self.secret is not None else []
+
+    @solution.setter
+    def solution(self, solution):
+        self.secret = self.encode(solution)
+
+    @property
+    def board(self):
+        """rows of (guess, feedback) letters, filled from the bottom up"""
+        board = [([''] * self.pegs, []) for _ in range(self.max_guesses)]
+        for i, (code, result) in enumerate(self.history()):
+            black, white = divmod(result, self.pegs + 1)
+            board[self.max_guesses - 1 - i] = (self.decode(code), ['B'] * black + ['W'] * white)
+        return board
+
+    @property
+    def candidates(self):
+        """consistent solutions, built on first use and then kept up to date"""
+        if self._candidates is None:
+            self._candidates = CandidateSet(self.pegs, len(self.colors), self.duplicates)
+            for code, result in self.history():
+                self._candidates.update(code, result)
+        return self._candidates
 
     def get_board(self):
         """returns game board"""
@@ -39,80 +148,142 @@ class Game:
     def create_solution(self):
         """creates valid solution based on criteria specified from user"""
         if self.duplicates:
-            self.solution = [random.choice(self.colors) for _ in range(4)]
+            self.solution = [random.choice(self.colors) for _ in range(self.pegs)]
         else:
-            self.solution = random.sample(self.colors, 4)
+            self.solution = random.sample(self.colors, self.pegs)
+
+    def reset(self):
+        """
+        clears the board for another game, keeping settings, observers and
+        the solution until a new one is set
+        """
+        self.guess_counter = self.max_guesses - 1
+        self.game_over = False
+        self.player_win = False
+        self.comp_p2_win = False
+        if self._candidates is not None:
+            self._candidates.reset()
 
     def get_solution(self):
         """returns correct solution"""
         return self.solution
 
+    def get_candidates(self):
+        """returns the solutions still consistent with the board"""
+        return self.candidates
+
     def guess_row(self, guess):
         """valid game move"""
         if self.game_over:
             return False
 
-        result = self.feedback(guess)
-        row = (guess, result)
+        code = self.encode(guess)
+        if self.evil:
+            # the solution shown is one still consistent with every answer given
+            result, self.secret = self.candidates.answer(code)
+            black, white = divmod(result, self.pegs + 1)
+        else:
+            black, white = self.score(code)
+            result = black * (self.pegs + 1) + white
 
-        self.board[self.guess_counter] = row
+        played = self.max_guesses - 1 - self.guess_counter
+        self.guesses[played] = code
+        self.results[played] = result
+        if self._candidates is not None and not self.evil:
+            self._candidates.update(code, result)
 
         self.guess_counter -= 1
 
-        if self.verification(guess, result):
+        self.notify('guess')
+
+        if black == self.pegs:
             self.game_over = True
             self.player_win = True
-            self.feedback(guess)
-            pprint.pprint(self.board)
-            print('Congratulations! You won!')
+            self.notify('win')
 
-        if self.guess_counter < 0:
+        elif self.guess_counter < 0:
             self.game_over = True
             self.comp_p2_win = True
-            print('Sorry you lost!')
-
-        pprint.pprint(self.board)
+            self.notify('lose')
 
         return True
 
+    def score(self, code):
+        """returns (black, white) for a numbered guess against the solution"""
+        colors = len(self.colors)
+        return score_code(decode(code, self.pegs, colors), decode(self.secret, self.pegs, colors), colors)
+
     def feedback(self, guess):
         """feedback to user based on guesses made"""
-        result = []
-        row = guess
-        tracker = {x: [] for x in row}
-
-        for i in range(len(self.solution)):
-            sol = self.solution[i]
-            guess = row[i]
-
-            if sol == guess:
-                tracker[sol] = ['B']
-
-            elif sol in row:
-                tracker[sol] += ['W']
-
-        for i in tracker:
-            self.colors_seen.append(i)
-            for j in tracker[i]:
-                if self.duplicates:
-                    result += [j]
-                    self.colors_in_sol.append(j)
-                else:
-                    result += [j[0]]
-                    self.colors_in_sol.append(j[0])
+        black, white = self.score(self.encode(guess))
+        result = ['B'] * black + ['W'] * white
 
         random.shuffle(result)
 
         return result
 
     def verification(self, guess, result):
-        if guess == self.solution and result == ['B', 'B', 'B', 'B']:
+        if list(guess) == self.solution and result == ['B'] * self.pegs:
             return True
         else:
             return False
 
-    def solver(self):
-        pass
+    def history(self):
+        """returns (numbered guess, packed feedback) for each row played, oldest first"""
+        played = self.max_guesses - 1 - self.guess_counter
+        return list(zip(self.guesses[:played], self.results[:played]))
+
+    def next_guess(self, budget_ms=None):
+        """
+        returns knuth's minimax guess for the current board, or the best
+        sampled guess found within budget_ms when a budget is given
+        """
+        if budget_ms is not None:
+            code = sampled_guess(self.candidates.ft, self.candidates.indices(), budget_ms)
+        else:
+            history = self.history()
+
+            # early moves come straight from the opening book when there is one
+            book = load_book(self.pegs, len(self.colors), self.duplicates)
+            code = book.guess(history) if book is not None else None
+
+            if code is None and not history:
+                code = opening_guess(self.pegs, len(self.colors), self.duplicates)
+            elif code is None:
+                # only one guess from each class of equivalent guesses is scored
+                guesses = representatives([guess for guess, _ in history], self.pegs, len(self.colors))
+                code = knuth_guess(self.candidates.ft, self.candidates.indices(), guesses)
+
+        return self.decode(code)
+
+    def optimal_strategy(self, processes=None):
+        """
+        searches for the strategy tree with the fewest guesses on average,
+        returns (tree, stats), guesses in the tree are color indices
+        """
+        return optimal_strategy(self.pegs, len(self.colors), self.duplicates, processes)
+
+    def solver(self, budget_ms=None):
+        """
+        plays the game out with knuth's algorithm, or the sampled solver
+        when budget_ms is given, returns guesses made
+        """
+        guesses = []
+        while not self.game_over:
+            guess = self.next_guess(budget_ms)
+            self.guess_row(guess)
+            guesses.append(guess)
+        return guesses
+
+
+def print_events(event, game):
+    """terminal observer, prints the board after each guess and the outcome"""
+    if event == 'guess':
+        pprint.pprint(game.get_board())
+    elif event == 'win':
+        print('Congratulations! You won!')
+    elif event == 'lose':
+        print('Sorry you lost!')
 
 
 if __name__ == '__main__':
@@ -130,7 +301,7 @@ if __name__ == '__main__':
         print("Mastermind, have other player look away and create your solution using the following colors "
               "R, B, G, Y, O, W (Enter 1 at a time)\n")
         solution = []
-        valid_picks = 4
+        valid_picks = game.pegs
         while valid_picks > 0:
             to_add = input()
             valid_choices = game.colors
@@ -149,16 +320,21 @@ if __name__ == '__main__':
         game.solution = solution
 
     else:
-        game = Game(1, allow_duplicates)
+        evil = input('Play against an evil codemaker that never settles on a solution? (y/n)') == 'y'
+        game = Game(1, allow_duplicates, evil=evil)
         game.create_solution()
 
+    game.subscribe(print_events)
+    game.subscribe(open_recorder())
     pprint.pprint(game.get_board())
     game.solution = ['R', 'B', 'G', 'Y']
     row = []
-    for j in range(8):
+    for j in range(game.max_guesses):
 
-        for i in range(4):
+        for i in range(game.pegs):
             guess = input("Input 4 letters representing the colors for your guess (R, B, Y, G, O, W)")
+            while guess not in game.colors:
+                guess = input('Please choose a valid option')
             row.append(guess)
 
         game.guess_row(row)
@@ -1,5 +1,36 @@
+import asyncio
+import contextlib
+import io
+import json
+import os
+import pickle
+import random
+import tempfile
+import time
 import unittest
+from unittest import mock
+import numpy as np
 from terminal_game import *
+from scoring import decode, encode, pack, score, score_code, score_pairs, unpack
+from solver import FeedbackTable, knuth_guess, knuth_solve, load_table, opening_guess, sampled_guess, filter_candidates
+from symmetry import canonical, representatives
+from optimal import optimal_strategy
+import book
+import simulate
+import frame_stats
+import server
+import loadgen
+import recording
+import analytics
+import hints
+import solver
+import bench
+import pygame
+import setup
+import mastermind
+
+# keep opening books out of the user's cache
+os.environ['MASTERMIND_CACHE'] = tempfile.mkdtemp()
 
 # Test Suite for Mastermind Game
 
@@ -17,47 +48,920 @@ class FeedbackTests(unittest.TestCase):
         cls.test_game2.solution = ['R', 'G', 'R', 'Y']
 
     def test_1(self):
-        guess = self.test_game.guess_row('B', 'G', 'R', 'Y')
+        guess = ['B', 'G', 'R', 'Y']
         result = self.test_game.feedback(guess)
         expected = ['W', 'W', 'W', 'W']
         self.assertEqual(set(result), set(expected))
 
     def test_2(self):
-        guess = self.test_game.guess_row('Y', 'Y', 'Y', 'Y')
+        guess = ['Y', 'Y', 'Y', 'Y']
         result = self.test_game.feedback(guess)
         expected = ['B']
         self.assertEqual(set(result), set(expected))
 
     def test_3(self):
-        guess = self.test_game.guess_row('O', 'O', 'O', 'O')
+        guess = ['O', 'O', 'O', 'O']
         result = self.test_game.feedback(guess)
         expected = []
         self.assertEqual(set(result), set(expected))
 
     def test_4(self):
-        guess = self.test_game.guess_row('Y', 'R', 'G', 'B')
+        guess = ['Y', 'R', 'G', 'B']
         result = self.test_game.feedback(guess)
         expected = ['B', 'B', 'B', 'B']
         self.assertEqual(set(result), set(expected))
 
     def test_5(self):
-        guess = self.test_game.guess_row('R', 'Y', 'Y', 'Y')
+        guess = ['R', 'Y', 'Y', 'Y']
         result = self.test_game.feedback(guess)
         expected = ['W', 'W']
         self.assertEqual(set(result), set(expected))
 
     def test_6(self):
-        guess = self.test_game2.guess_row('R', 'R', 'R', 'R')
+        guess = ['R', 'R', 'R', 'R']
         result = self.test_game2.feedback(guess)
         expected = ['B', 'B']
         self.assertEqual(set(result), set(expected))
 
     def test_7(self):
-        guess = self.test_game2.guess_row('O', 'R', 'R', 'O')
+        guess = ['O', 'R', 'R', 'O']
         result = self.test_game2.feedback(guess)
-        expected = ['B']
+        expected = ['B', 'W']
         self.assertEqual(set(result), set(expected))
 
 
+class SolverTests(unittest.TestCase):
+    """Tests knuth solver finds every solution within five guesses"""
+    def test_all_secrets_with_duplicates(self):
+        ft = load_table(4, 6, True)
+        first = opening_guess(4, 6, True)
+        for secret in range(len(ft)):
+            self.assertLessEqual(len(knuth_solve(ft, secret, first)), 5)
+
+    def test_all_secrets_without_duplicates(self):
+        ft = load_table(4, 6, False)
+        first = opening_guess(4, 6, False)
+        for secret in range(len(ft)):
+            self.assertLessEqual(len(knuth_solve(ft, secret, first)), 5)
+
+    def test_game_solver(self):
+        for solution in (['R', 'R', 'R', 'R'], ['O', 'W', 'O', 'W'], ['Y', 'R', 'G', 'B']):
+            game = Game(1, True)
+            game.solution = solution
+            guesses = game.solver()
+            self.assertTrue(game.player_win)
+            self.assertEqual(guesses[-1], solution)
+            self.assertLessEqual(len(guesses), 5)
+
+
+class BatchScoringTests(unittest.TestCase):
+    """Tests batch scoring agrees with single game feedback"""
+    def test_matches_game_feedback(self):
+        game = Game(1, True)
+        rng = np.random.default_rng(0)
+        guesses = rng.integers(0, 6 ** 4, 40)
+        secrets = rng.integers(0, 6 ** 4, 30)
+        black, white = score(guesses, secrets)
+
+        for i, guess in enumerate(guesses):
+            for j, secret in enumerate(secrets):
+                game.solution = [game.colors[x] for x in decode(secret)]
+                result = game.feedback([game.colors[x] for x in decode(guess)])
+                self.assertEqual((black[i, j], white[i, j]), (result.count('B'), result.count('W')))
+
+    def test_pairs_match_outer_diagonal(self):
+        codes = np.arange(6 ** 4)
+        shuffled = np.random.default_rng(1).permutation(codes)
+        black, white = score_pairs(codes, shuffled)
+        self.assertTrue((black == score(codes, shuffled)[0].diagonal()).all())
+        self.assertTrue((white == score(codes, shuffled)[1].diagonal()).all())
+
+    def test_pack_round_trip(self):
+        black, white = score(np.arange(6 ** 4), [0, 7, 1295])
+        self.assertTrue(all((x == y).all() for x, y in zip(unpack(pack(black, white)), (black, white))))
+
+
+class CandidateTests(unittest.TestCase):
+    """Tests candidate index tracks the board after each guess"""
+    def test_guess_row_narrows_candidates(self):
+        game = Game(1, True)
+        game.solution = ['Y', 'R', 'G', 'B']
+        self.assertEqual(len(game.get_candidates()), 6 ** 4)
+
+        game.guess_row(['R', 'R', 'B', 'B'])
+        remaining = len(game.get_candidates())
+        self.assertLess(remaining, 6 ** 4)
+
+        game.guess_row(['Y', 'Y', 'G', 'G'])
+        self.assertLess(len(game.get_candidates()), remaining)
+
+        secret = encode([game.colors.index(x) for x in game.solution])
+        self.assertIn(secret, game.get_candidates())
+
+    def test_candidates_agree_with_board(self):
+        game = Game(1, False)
+        game.solution = ['W', 'O', 'B', 'R']
+        for guess in (['R', 'B', 'Y', 'G'], ['O', 'W', 'R', 'Y']):
+            game.guess_row(guess)
+
+        for code in game.get_candidates():
+            secret = [game.colors[x] for x in decode(code)]
+            for guess, result in game.board[game.guess_counter + 1:]:
+                game.solution = secret
+                self.assertEqual(sorted(game.feedback(guess)), sorted(result))
+
+
+class VariantTests(unittest.TestCase):
+    """Tests games with other peg, color and guess counts"""
+    def test_board_follows_settings(self):
+        game = Game(1, False, pegs=5, colors='RBYGWOPC', guesses=10)
+        game.create_solution()
+        self.assertEqual(len(game.get_board()), 10)
+        self.assertEqual(len(game.get_solution()), 5)
+        self.assertEqual(len(game.get_candidates()), 8 * 7 * 6 * 5 * 4)
+
+        game.guess_row(game.get_solution())
+        self.assertTrue(game.player_win)
+
+    def test_solver_on_small_variant(self):
+        game = Game(1, True, pegs=3, colors='RBYG', guesses=6)
+        game.solution = ['G', 'G', 'R']
+        game.solver()
+        self.assertTrue(game.player_win)
+
+    def test_chunked_scoring_matches_table(self):
+        ft = load_table(4, 6, False)
+        lazy = FeedbackTable.__new__(FeedbackTable)
+        lazy.__dict__.update(ft.__dict__, table=None)
+        guesses = np.arange(0, 6 ** 4, 7)
+        self.assertTrue((lazy.feedback(guesses, np.arange(len(ft))) == ft.table[guesses]).all())
+        self.assertEqual(knuth_guess(lazy, np.arange(50, 200)), knuth_guess(ft, np.arange(50, 200)))
+
+    def test_large_variant_filtering(self):
+        game = Game(1, True, pegs=6, colors='RBYGWOPCM', guesses=10)
+        game.solution = list('RRBYCM')
+        game.guess_row(list('RBYGWO'))
+        game.guess_row(list('PCMRRB'))
+        self.assertIn(encode([game.colors.index(x) for x in game.solution], 9), game.get_candidates())
+        self.assertLess(len(game.get_candidates()), 9 ** 6 // 100)
+
+
+class SampledSolverTests(unittest.TestCase):
+    """Tests time budgeted solver on large and small variants"""
+    def test_solves_large_variant(self):
+        game = Game(1, True, pegs=6, colors='RBYGWOPCM', guesses=12)
+        game.solution = list('MRCCYO')
+        game.solver(budget_ms=30)
+        self.assertTrue(game.player_win)
+
+    def test_stays_near_budget(self):
+        game = Game(1, True, pegs=5, colors='RBYGWOPC')
+        game.create_solution()
+        start = time.perf_counter()
+        guess = game.next_guess(budget_ms=20)
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual(len(guess), 5)
+
+    def test_guess_from_two_candidates(self):
+        ft = load_table(4, 6, True)
+        self.assertEqual(sampled_guess(ft, [3, 9], 10), ft.rows[3])
+
+
+class SymmetryTests(unittest.TestCase):
+    """Tests guess classes under position and color symmetry"""
+    def test_opening_classes(self):
+        self.assertEqual(list(representatives()), [encode(x) for x in
+                                                   ([0, 0, 0, 0], [0, 0, 0, 1], [0, 0, 1, 1],
+                                                    [0, 0, 1, 2], [0, 1, 2, 3])])
+        self.assertEqual(len(np.unique(canonical(np.arange(6 ** 4)))), 5)
+
+    def test_equivalent_guesses_split_alike(self):
+        ft = load_table(4, 6, True)
+        played = [encode([0, 0, 1, 2])]
+        candidates = filter_candidates(ft, np.arange(len(ft)), played[0], 5)
+        classes = canonical(np.arange(6 ** 4), played)
+        self.assertLess(len(np.unique(classes)), 6 ** 4 // 8)
+
+        sizes = np.concatenate([s for _, s in ft.partitions(candidates)])
+        for rep in np.unique(classes):
+            members = np.flatnonzero(classes == rep)
+            self.assertTrue((np.sort(sizes[members], axis=1) == np.sort(sizes[rep])).all())
+
+
+class OptimalStrategyTests(unittest.TestCase):
+    """Tests optimal strategy search on small variants"""
+    def play(self, tree, secret, colors):
+        """follows the tree against a secret, returns guesses made"""
+        game = Game(1, True, pegs=len(secret), colors=colors)
+        game.solution = [colors[x] for x in secret]
+        node, guesses = tree, 0
+        while True:
+            guesses += 1
+            result = game.feedback([colors[x] for x in node['guess']])
+            if result.count('B') == len(secret):
+                return guesses
+            node = node['children']['{}B{}W'.format(result.count('B'), result.count('W'))]
+
+    def test_matches_exhaustive_search(self):
+        # totals checked against a search with no pruning or symmetry
+        for pegs, colors, duplicates, total in ((2, 4, True, 45), (3, 3, True, 73), (3, 4, False, 69)):
+            tree, stats = optimal_strategy(pegs, colors, duplicates, processes=1)
+            self.assertEqual(stats['total_guesses'], total)
+
+    def test_tree_solves_every_secret(self):
+        game = Game(1, True, pegs=3, colors='RBYG')
+        tree, stats = game.optimal_strategy(processes=1)
+        played = [self.play(tree, secret, game.colors) for secret in load_table(3, 4, True).codes]
+        self.assertEqual(sum(played), stats['total_guesses'])
+        self.assertEqual(max(played), stats['max_guesses'])
+
+    def test_process_pool_agrees(self):
+        tree, stats = optimal_strategy(3, 4, True, processes=2)
+        self.assertEqual(stats['total_guesses'], optimal_strategy(3, 4, True, processes=1)[1]['total_guesses'])
+        self.assertEqual(stats['processes'], 2)
+
+
+class OpeningBookTests(unittest.TestCase):
+    """Tests opening book storage and lookups"""
+    def test_book_matches_solver(self):
+        ft = load_table(4, 6, False)
+        opened = book.load_book(4, 6, False)
+        self.assertTrue((np.asarray(opened.table) == ft.table).all())
+
+        for secret in range(0, len(ft), 7):
+            candidates = np.arange(len(ft))
+            history = []
+            for guess in knuth_solve(ft, secret, opening_guess(4, 6, False))[:book.BOOK_DEPTH]:
+                self.assertEqual(opened.guess(history), guess)
+                result = ft.table[guess, secret]
+                history.append((guess, result))
+
+    def test_stale_book_is_rebuilt(self):
+        path = book.book_path(3, 4, True)
+        book.write_book(path, 3, 4, True)
+        header = np.memmap(path, book.HEADER, 'r+', shape=1)
+        header['version'] = book.BOOK_VERSION + 1
+        header.flush()
+        del header
+
+        self.assertFalse(book.OpeningBook(path).matches(3, 4, True))
+        book._books.pop((3, 4, True), None)
+        self.assertTrue(book.load_book(3, 4, True).matches(3, 4, True))
+
+    def test_leaving_book(self):
+        opened = book.load_book(4, 6, True)
+        self.assertIsNone(opened.guess([(opened.guess([]) + 1, 0)]))
+
+
+class SimulationTests(unittest.TestCase):
+    """Tests quiet game core, observers and batch runs"""
+    def test_guess_row_is_quiet(self):
+        game = Game(1, True)
+        game.solution = ['R', 'G', 'R', 'Y']
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            game.guess_row(['R', 'G', 'R', 'Y'])
+        self.assertEqual(out.getvalue(), '')
+
+    def test_observer_events(self):
+        events = []
+        game = Game(1, False, guesses=2)
+        game.subscribe(lambda event, g: events.append(event))
+        game.solution = ['Y', 'R', 'G', 'B']
+        game.guess_row(['R', 'B', 'Y', 'G'])
+        game.guess_row(['Y', 'R', 'G', 'B'])
+        self.assertEqual(events, ['guess', 'guess', 'win'])
+
+        events.clear()
+        game = Game(1, False, guesses=1)
+        game.subscribe(lambda event, g: events.append(event))
+        game.solution = ['Y', 'R', 'G', 'B']
+        game.guess_row(['R', 'B', 'Y', 'G'])
+        self.assertEqual(events, ['guess', 'lose'])
+
+    def test_batch_run(self):
+        stats = simulate.run(50, simulate.knuth, seed=3)
+        self.assertEqual(stats['wins'], 50)
+        self.assertLessEqual(max(stats['guesses']), 5)
+        self.assertEqual(sum(stats['guesses'].values()), 50)
+        self.assertGreater(stats['games_per_sec'], 0)
+
+
+class CompactStateTests(unittest.TestCase):
+    """Tests integer coded game state, copies and pickling"""
+    def setUp(self):
+        self.game = Game(1, True)
+        self.game.solution = ['R', 'G', 'R', 'Y']
+        self.game.guess_row(['O', 'R', 'R', 'O'])
+
+    def test_state_is_compact(self):
+        self.assertFalse(hasattr(self.game, '__dict__'))
+        self.assertEqual(self.game.history(), [(self.game.encode('ORRO'), 1 * 5 + 1)])
+        self.assertEqual(self.game.board[7], (['O', 'R', 'R', 'O'], ['B', 'W']))
+        self.assertEqual(self.game.board[6], (['', '', '', ''], []))
+
+    def test_copy_is_independent(self):
+        remaining = len(self.game.get_candidates())
+        other = self.game.copy()
+        other.guess_row(['R', 'G', 'R', 'Y'])
+        self.assertTrue(other.player_win)
+        self.assertFalse(self.game.game_over)
+        self.assertEqual(len(self.game.history()), 1)
+        self.assertEqual(len(self.game.get_candidates()), remaining)
+
+    def test_pickle_round_trip(self):
+        self.game.subscribe(lambda event, game: None)
+        other = pickle.loads(pickle.dumps(self.game))
+        self.assertEqual(other.board, self.game.board)
+        self.assertEqual(len(other.get_candidates()), len(self.game.get_candidates()))
+        self.assertEqual(other.observers, ())
+
+    def test_unknown_color_rejected(self):
+        with self.assertRaises(ValueError):
+            self.game.guess_row(['X', 'R', 'R', 'O'])
+
+    def test_settings_checked(self):
+        for pegs, colors, guesses in ((13, None, 8), (16, 'RB', 8), (10 ** 9, None, 8), (4, None, 0), (0, None, 8),
+                                      (4, 'RRBG', 8)):
+            with self.assertRaises(ValueError):
+                Game(1, True, pegs, colors, guesses)
+        with self.assertRaises(ValueError):
+            Game(1, False, 7)
+        self.assertEqual(Game(1, True, 12).pegs, 12)
+
+
+class HeadlessDisplayTests(unittest.TestCase):
+    """Tests the pygame board renders with no display server"""
+    def test_render_offscreen(self):
+        screen = setup.init_display(headless=True)
+        pygame.font.init()
+        self.assertIs(setup.get_screen(), screen)
+
+        game = mastermind.Game()
+        game.game_board()
+        game.fb_board()
+        screen.fill(setup.BGCOLOR)
+        game.draw_board()
+        setup.main_legend()
+        self.assertEqual(tuple(screen.get_at((setup.LEFTMARGIN + 5, setup.TOPMARGIN + 5)))[:3], setup.BLACK)
+
+    def test_headless_after_pygame_init(self):
+        pygame.display.quit()
+        os.environ['SDL_VIDEODRIVER'] = 'offscreen'
+        pygame.init()
+        setup.init_display(headless=True)
+        self.assertEqual(pygame.display.get_driver(), 'dummy')
+
+
+class TextCacheTests(unittest.TestCase):
+    """Tests fonts and rendered text are reused between frames"""
+    def setUp(self):
+        # other tests leave text in the module's cache
+        setup.clear_text_cache()
+
+    def test_text_rendered_once(self):
+        setup.init_display(headless=True)
+        pygame.font.init()
+        setup.main_legend()
+        cached = len(setup._text)
+
+        setup.main_legend()
+        setup.start_screen()
+        setup.start_screen()
+        self.assertIs(setup.render_text('Rules:', 25, underline=True),
+                      setup.render_text('Rules:', 25, underline=True))
+        self.assertIsNot(setup.render_text('Rules:', 25), setup.render_text('Rules:', 25, underline=True))
+        self.assertEqual(cached, 6)
+        self.assertIs(setup.get_font(14), setup.get_font(14))
+
+
+class DirtyRenderTests(unittest.TestCase):
+    """Tests only changed tiles are redrawn"""
+    def test_only_changed_tiles_drawn(self):
+        setup.init_display(headless=True)
+        game = mastermind.Game()
+        game.game_board()
+        game.fb_board()
+        self.assertEqual(len(game.draw_board() + game.draw_feedback()), 9 * 4 + 8 * 4)
+        self.assertEqual(game.draw_board() + game.draw_feedback(), [])
+
+        game.board[8][2].update(setup.RED)
+        self.assertEqual(game.draw_board(), [game.board[8][2].screen_rect])
+        self.assertEqual(len(game.draw_board(full=True)), 9 * 4)
+        self.assertEqual(tuple(setup.get_screen().get_at(game.board[8][2].screen_rect.center))[:3], setup.RED)
+
+
+class SessionTests(unittest.TestCase):
+    """Tests the pygame session plays and resets without rebuilding"""
+    def setUp(self):
+        setup.init_display(headless=True)
+        self.session = mastermind.Session()
+        self.addCleanup(self.session.close)
+
+    def play_row(self, colors):
+        for i, color in enumerate(colors):
+            for _ in range(self.session.tile_colors.index(color)):
+                self.session.handle_key(pygame.K_UP)
+            if i < len(colors) - 1:
+                self.session.handle_key(pygame.K_RIGHT)
+        self.session.handle_key(pygame.K_RETURN)
+
+    def test_win(self):
+        session = self.session
+        session.handle_key(pygame.K_SPACE)
+        self.assertEqual(session.state, 'playing')
+        self.play_row(session.game.solution)
+        self.assertEqual(session.state, 'over')
+        session.render()
+
+    def test_settings_shown_and_checked(self):
+        self.assertEqual(self.session.tile_colors, [setup.TILE, setup.RED, setup.BLUE, setup.YELLOW, setup.GREEN,
+                                                    setup.ORANGE, setup.PURPLE])
+        mastermind.Session(mastermind.Game(pegs=5, duplicates=True)).close()
+        self.assertIn(('- Objective of the game is to guess the 5 color solution generated by the CPU', 14,
+                       setup.TEXT, False), setup._text)
+        self.assertIn(('- There may be duplicate colors in the solution', 14, setup.TEXT, False), setup._text)
+
+        for settings in ({'guesses': 9}, {'pegs': 6}):
+            with self.assertRaises(ValueError):
+                mastermind.Game(**settings)
+
+    def test_tiles_dont_overlap(self):
+        window = pygame.Rect(0, 0, setup.WINDOWWIDTH, setup.WINDOWHEIGHT)
+        for pegs in range(1, 6):
+            game = mastermind.Game(pegs=pegs)
+            rects = [tile.screen_rect for row in game.game_board() + game.fb_board() for tile in row]
+            self.assertTrue(all(window.contains(rect) for rect in rects))
+            self.assertTrue(all(rect.collidelist(rects[i + 1:]) == -1 for i, rect in enumerate(rects)))
+
+    def test_rules_played_by_core(self):
+        session = self.session
+        events = []
+        session.game.subscribe(lambda event, core: events.append(event))
+        session.game.solution = session.game.colors[:4]
+
+        session.handle_key(pygame.K_SPACE)
+        for _ in range(session.game.max_guesses):
+            self.play_row(session.game.colors[1:5])
+        self.assertEqual(session.state, 'over')
+        self.assertTrue(session.game.core.comp_p2_win)
+        self.assertFalse(session.game.verification())
+        self.assertEqual(events, ['guess'] * session.game.max_guesses + ['lose'])
+        self.assertEqual(session.game.history()[0], (encode([1, 2, 3, 4]), 0 * 5 + 3))
+
+    def test_queued_keys_one_frame(self):
+        session = self.session
+        render, frame, renders, frames = session.render, session.frame, [], []
+        session.render = lambda: renders.append(render())
+
+        def one_frame():
+            # the second frame ends the loop after the first one's tick
+            if frames:
+                raise SystemExit
+            frames.append(frame())
+        session.frame = one_frame
+
+        pygame.font.init()
+        pygame.event.clear()
+        for key in (pygame.K_SPACE, pygame.K_UP, pygame.K_UP, pygame.K_RIGHT, pygame.K_UP):
+            pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=key))
+        with self.assertRaises(SystemExit):
+            session.run()
+
+        row = session.game.board[session.turn_counter]
+        self.assertEqual((session.state, session.key_pos), ('playing', 1))
+        self.assertEqual([tile.color for tile in row[:2]], session.tile_colors[2:0:-1])
+        self.assertEqual(len(renders), 1)
+        self.assertEqual(len(session.stats.samples['interval']), 1)
+        self.assertEqual(pygame.event.get(pygame.KEYDOWN), [])
+
+    def test_new_game_reuses_tiles(self):
+        session = self.session
+        tiles = [tile for row in session.game.board + session.game.feedback for tile in row]
+
+        session.handle_key(pygame.K_SPACE)
+        self.play_row(session.game.colors[:4])
+        session.render()
+        for _ in range(50):
+            session.handle_key(pygame.K_n)
+        self.assertEqual(session.state, 'intro')
+        self.assertEqual(session.turn_counter, session.game.max_guesses)
+
+        after = [tile for row in session.game.board + session.game.feedback for tile in row]
+        self.assertTrue(all(a is b for a, b in zip(tiles, after)))
+        self.assertTrue(all(tile.image is setup.tile_image(setup.TILE, tile.size) for tile in after[4:]))
+        self.assertTrue(all(tile.color == setup.TILE for row in session.game.board[1:] for tile in row))
+        self.assertEqual([tile.color for tile in session.game.board[0]], session.game.solution)
+
+
+class TileAtlasTests(unittest.TestCase):
+    """Tests tiles share pre-rendered images"""
+    def test_shared_images(self):
+        setup.init_display(headless=True)
+        self.assertIs(setup.tile_image(setup.RED, 60), setup.tile_image(setup.RED, 60))
+        self.assertIsNot(setup.tile_image(setup.RED, 60), setup.tile_image(setup.RED, 60, border=True))
+
+        game = mastermind.Game()
+        game.game_board()
+        self.assertIs(game.board[1][0].image, game.board[2][3].image)
+        game.board[1][0].update(setup.RED)
+        self.assertIs(game.board[1][0].image, setup.tile_image(setup.RED, setup.TILESIZE))
+
+    def test_selected_tile_bordered(self):
+        setup.init_display(headless=True)
+        session = mastermind.Session()
+        self.addCleanup(session.close)
+        session.handle_key(pygame.K_SPACE)
+        session.handle_key(pygame.K_RIGHT)
+        row = session.game.board[session.turn_counter]
+        self.assertIs(row[1].image, setup.tile_image(setup.TILE, setup.TILESIZE, border=True))
+        self.assertIs(row[0].image, setup.tile_image(setup.TILE, setup.TILESIZE))
+
+        session.render()
+        self.assertEqual(tuple(setup.get_screen().get_at(row[1].screen_rect.topleft))[:3], setup.BLACK)
+        self.assertEqual(tuple(setup.get_screen().get_at(row[1].screen_rect.center))[:3], setup.TILE)
+
+
+class FrameStatsTests(unittest.TestCase):
+    """Tests frame timings, the overlay and the JSON export"""
+    def test_rolling_window(self):
+        stats = frame_stats.FrameStats(window=10)
+        for i in range(20):
+            stats.record('frame', i / 1000)
+        self.assertEqual(len(stats.samples['frame']), 10)
+        self.assertAlmostEqual(stats.percentile('frame', 50), 14.5)
+        self.assertIsNone(stats.percentile('flip', 50))
+        self.assertEqual(sum(stats.histograms()['frame']), 10)
+
+    def test_session_overlay_and_dump(self):
+        setup.init_display(headless=True)
+        path = os.path.join(tempfile.mkdtemp(), 'stats.json')
+        session = mastermind.Session(stats_path=path)
+        self.addCleanup(session.close)
+        for key in (pygame.K_F3, pygame.K_SPACE, pygame.K_UP, pygame.K_RIGHT):
+            pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=key))
+            session.frame()
+        self.assertTrue(session.overlay)
+        self.assertEqual(len(session.overlay_lines()), 3)
+
+        session.handle_key(pygame.K_F4)
+        with open(path) as f:
+            saved = json.load(f)
+        for name in ('events', 'board', 'feedback', 'legend', 'flip', 'frame', 'latency'):
+            self.assertIn(name, saved['summary'])
+            self.assertEqual(len(saved['histograms'][name]), len(saved['bins_ms']) - 1)
+
+
+class ServerTests(unittest.TestCase):
+    """Tests the game server over real connections"""
+    def test_codemaker_and_codebreaker(self):
+        async def scenario():
+            game_server = await server.start(port=0)
+            port = game_server.sockets[0].getsockname()[1]
+            maker = await asyncio.open_connection(server.HOST, port)
+            breaker = await asyncio.open_connection(server.HOST, port)
+
+            async def call(conn, message):
+                conn[1].write(json.dumps(message).encode() + b'\n')
+                return json.loads(await conn[0].readline())
+
+            made = await call(maker, {'op': 'make', 'solution': ['R', 'B', 'Y', 'G'], 'duplicates': False})
+            bad = await call(breaker, {'op': 'guess', 'game': made['game'], 'guess': ['R', 'B', 'Y', 'G']})
+            joined = await call(breaker, {'op': 'join'})
+            wrong = await call(breaker, {'op': 'guess', 'game': joined['game'], 'guess': ['R', 'Y', 'B', 'X']})
+            first = await call(breaker, {'op': 'guess', 'game': joined['game'], 'guess': ['R', 'Y', 'B', 'W']})
+            last = await call(breaker, {'op': 'guess', 'game': joined['game'], 'guess': ['R', 'B', 'Y', 'G']})
+            events = [json.loads(await maker[0].readline()) for _ in range(4)]
+
+            for _, writer in (maker, breaker):
+                writer.close()
+            game_server.close()
+            await game_server.wait_closed()
+            return made, bad, joined, wrong, first, last, events
+
+        made, bad, joined, wrong, first, last, events = asyncio.run(scenario())
+        self.assertTrue(made['ok'])
+        self.assertFalse(bad['ok'])
+        self.assertEqual(joined['game'], made['game'])
+        self.assertFalse(wrong['ok'])
+        self.assertEqual((first['black'], first['white'], first['left'], first['over']), (1, 2, 7, False))
+        self.assertTrue(last['win'] and last['over'])
+        self.assertEqual(last['solution'], ['R', 'B', 'Y', 'G'])
+        self.assertEqual([e['event'] for e in events], ['join', 'guess', 'guess', 'win'])
+        self.assertEqual(events[1]['guess'], ['R', 'Y', 'B', 'W'])
+
+    def test_finished_games_forgotten(self):
+        game_server = server.GameServer()
+        maker, breaker = (mock.Mock(**{'is_closing.return_value': True}) for _ in range(2))
+        for writer in (maker, breaker):
+            game_server.owned[writer] = set()
+
+        made = game_server.request({'op': 'make', 'solution': 'RBYG'}, maker, game_server.owned[maker])
+        game_server.request({'op': 'join'}, breaker, game_server.owned[breaker])
+        self.assertEqual(game_server.owned[breaker], {made['game']})
+        game_server.request({'op': 'guess', 'game': made['game'], 'guess': 'RBYG'}, breaker,
+                            game_server.owned[breaker])
+        self.assertEqual(game_server.owned, {maker: set(), breaker: set()})
+
+    def test_bad_settings_answered(self):
+        async def scenario():
+            game_server = await server.start(port=0, recorder=recording.Recorder(os.devnull))
+            port = game_server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection(server.HOST, port)
+
+            replies = []
+            for message in ({'op': 'new', 'guesses': 0}, {'op': 'new', 'guesses': 300},
+                            {'op': 'new', 'pegs': 13}, {'op': 'new', 'colors': 'RRBG'},
+                            {'op': 'new', 'colors': ['R', 'B']}, {'op': 'new', 'pegs': 10 ** 7},
+                            {'op': 'new', 'pegs': float('inf')}, {'op': 'new'}):
+                writer.write(json.dumps(message).encode() + b'\n')
+                replies.append(json.loads(await reader.readline()))
+
+            writer.close()
+            game_server.close()
+            await game_server.wait_closed()
+            return replies
+
+        replies = asyncio.run(scenario())
+        self.assertEqual([reply['ok'] for reply in replies], [False] * 7 + [True])
+
+    def test_load_generator(self):
+        stats = asyncio.run(loadgen.run(sessions=40, clients=10, local=True, seed=0))
+        self.assertEqual(stats['sessions'], 40)
+        self.assertGreaterEqual(stats['moves'], 40)
+        self.assertGreater(stats['latency_ms']['p99'], 0)
+
+
+class RecordingTests(unittest.TestCase):
+    """Tests games are recorded and loaded back"""
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'games.bin')
+
+    def test_terminal_games(self):
+        with recording.Recorder(self.path, buffer=16) as recorder:
+            stats = simulate.run(50, simulate.knuth, seed=3, observer=recorder)
+
+        records = recording.load(self.path)
+        self.assertIsInstance(records, np.memmap)
+        self.assertEqual(len(records), sum(n * count for n, count in stats['guesses'].items()))
+        self.assertEqual(len(np.unique(records['game'])), 50)
+        self.assertEqual(((records['flags'] & recording.WIN) > 0).sum(), stats['wins'])
+        self.assertEqual(((records['flags'] & recording.OVER) > 0).sum(), 50)
+
+        frame = recording.load_frame(self.path)
+        self.assertEqual(len(frame), len(records))
+        self.assertTrue((frame['black'][frame['win']] == 4).all())
+        self.assertEqual(frame.groupby('game')['move'].max().add(1).sum(), len(frame))
+
+    def test_partial_record_ignored(self):
+        game = Game(1, True)
+        game.solution = ['R', 'B', 'Y', 'G']
+        with recording.Recorder(self.path) as recorder:
+            game.subscribe(recorder)
+            game.guess_row(['R', 'R', 'B', 'B'])
+            game.guess_row(['R', 'B', 'Y', 'G'])
+        with open(self.path, 'ab') as f:
+            f.write(b'\0' * 5)
+
+        records = recording.load(self.path)
+        self.assertEqual(list(records['guess']), [game.encode('RRBB'), game.encode('RBYG')])
+        self.assertEqual(list(records['secret']), [game.secret] * 2)
+        self.assertEqual(list(records['result']), [1 * 5 + 1, 4 * 5])
+
+    def test_pygame_game(self):
+        setup.init_display(headless=True)
+        recorder = recording.Recorder(self.path, recording.PYGAME)
+        game = mastermind.Game(recorder=recorder)
+        game.game_board()
+        game.fb_board()
+        for tile, color in zip(game.board[8], game.solution):
+            tile.update(color)
+        self.assertTrue(game.assign_feedback(8))
+        recorder.close()
+
+        record = recording.load(self.path)[0]
+        self.assertEqual((record['move'], record['source'], record['guess']), (0, recording.PYGAME, record['secret']))
+        self.assertEqual(record['flags'], recording.OVER | recording.WIN)
+
+
+class AnalyticsTests(unittest.TestCase):
+    """Tests streaming summaries of recorded games"""
+    @classmethod
+    def setUpClass(cls):
+        cls.path = os.path.join(tempfile.mkdtemp(), 'games.bin')
+        with recording.Recorder(cls.path) as recorder:
+            cls.stats = simulate.run(60, simulate.consistent, seed=4, observer=recorder)
+
+    def test_candidate_counts(self):
+        records = np.array(recording.load(self.path))
+        before, after = analytics.candidate_counts(records)
+
+        game = records[records['game'] == records['game'][0]]
+        candidates = CandidateSet(4, 6, True)
+        for i, record in enumerate(game):
+            self.assertEqual(before[i], len(candidates))
+            candidates.update(int(record['guess']), int(record['result']))
+            self.assertEqual(after[i], len(candidates))
+
+    def test_chunk_size_doesnt_change_summary(self):
+        whole = analytics.analyze(self.path, reference={(4, 6, True): 4.34})
+        self.assertEqual(whole['games'], 60)
+        self.assertEqual(whole['guesses_to_solve'], self.stats['guesses'])
+        self.assertEqual(sum(whole['bits_histogram']), sum(n * c for n, c in self.stats['guesses'].items()))
+
+        player = whole['players'][0]
+        self.assertAlmostEqual(player['average_guesses'], self.stats['average_guesses'])
+        self.assertAlmostEqual(player['efficiency'], 4.34 / self.stats['average_guesses'])
+
+        self.assertEqual(analytics.analyze(self.path, chunk=7, reference={(4, 6, True): 4.34}), whole)
+
+
+class HintTests(unittest.TestCase):
+    """Tests hints are worked out off the frame loop and dropped when stale"""
+    def wait_for_hint(self, session):
+        deadline = time.perf_counter() + 10
+        while session.hint_rect is None and time.perf_counter() < deadline:
+            session.frame()
+            time.sleep(.01)
+
+    def test_hint_shown(self):
+        setup.init_display(headless=True)
+        pygame.font.init()
+        random.seed(2)
+        session = mastermind.Session(mastermind.Game(duplicates=True))
+        self.addCleanup(session.close)
+        game = session.game
+        session.handle_key(pygame.K_SPACE)
+        for _ in range(4):
+            session.handle_key(pygame.K_UP)
+            session.handle_key(pygame.K_RIGHT)
+        session.handle_key(pygame.K_RETURN)
+        history = game.history()
+        self.assertEqual(len(history), 1)
+
+        candidates = CandidateSet(4, 6, True)
+        candidates.update(*history[0])
+        session.handle_key(pygame.K_h)
+        self.wait_for_hint(session)
+        self.assertIsNotNone(session.hint_rect)
+        self.assertEqual(setup.get_screen().get_at((session.hint_rect.left + 10, session.hint_rect.top))[:3],
+                         game.colors[hints.suggest(history, 4, 6, True)[0][0]])
+
+        # changing the board drops the hint, and answers to old requests
+        session.handle_key(pygame.K_UP)
+        self.assertIsNone(session.hint_rect)
+        session.show_hint(pygame.event.Event(hints.HINT, generation=session.hints.generation - 1,
+                                             guess=[0, 0, 0, 0], candidates=len(candidates)))
+        self.assertIsNone(session.hint_rect)
+
+    def test_failed_request_dropped(self):
+        setup.init_display(headless=True)
+        pygame.event.clear()
+        engine = hints.HintEngine()
+        with contextlib.redirect_stderr(io.StringIO()) as errors:
+            # a guess past the last code can't be scored
+            engine.request([(6 ** 4 + 5, 0)], 4, 6, True)
+            while engine.pending is not None:
+                time.sleep(.01)
+            generation = engine.request([], 4, 6, True)
+            event = pygame.event.wait(10000)
+        engine.close()
+
+        self.assertIn('Traceback', errors.getvalue())
+        self.assertEqual((event.type, event.generation), (hints.HINT, generation))
+        self.assertFalse(engine.thread.is_alive())
+
+    def test_suggest(self):
+        guess, left = hints.suggest([], 4, 6, True)
+        self.assertEqual((guess, left), (decode(opening_guess(4, 6, True), 4, 6), 6 ** 4))
+
+
+class SharedTableTests(unittest.TestCase):
+    """Tests feedback tables are shared between processes without copies"""
+    def test_attach(self):
+        built = FeedbackTable(2, 3, True)
+        with solver.shared_table(built) as spec:
+            ft = solver.attach_table(spec)
+        self.assertIs(ft, load_table(2, 3, True))
+        self.assertTrue(np.array_equal(ft.table, built.table))
+        self.assertFalse(ft.table.flags.writeable)
+
+    def test_nothing_to_share(self):
+        ft = FeedbackTable(2, 3, True)
+        ft.table = None
+        with solver.shared_table(ft) as spec:
+            self.assertIsNone(spec)
+
+
+class BenchTests(unittest.TestCase):
+    """Tests the benchmark runner and baseline comparison"""
+    def test_run_and_compare(self):
+        results = bench.run(['check_complete', 'render_frame'], rounds=1)
+        self.assertEqual(set(results), {'check_complete', 'render_frame'})
+        for result in results.values():
+            self.assertGreater(result['ops_per_sec'], 0)
+            self.assertLessEqual(result['p50_us'], result['p99_us'])
+
+        self.assertEqual(bench.compare(results, results), {})
+        faster = {name: {'ops_per_sec': result['ops_per_sec'] * 2} for name, result in results.items()}
+        self.assertEqual(set(bench.compare(results, faster, .1)), set(results))
+        self.assertEqual(bench.compare(results, faster, .6), {})
+
+    def test_verification_times_a_won_board(self):
+        random.seed(0)
+        self.assertTrue(bench.verification(random.Random(0))())
+
+
+class ScoringKernelTests(unittest.TestCase):
+    """Tests the single pair scoring kernel against every code pair"""
+    def reference(self, guess, secret):
+        """scores by crossing off matched pegs, the slow obvious way"""
+        black = sum(g == s for g, s in zip(guess, secret))
+        unmatched = [s for g, s in zip(guess, secret) if g != s]
+        white = 0
+        for g, s in zip(guess, secret):
+            if g != s and g in unmatched:
+                unmatched.remove(g)
+                white += 1
+        return black, white
+
+    def test_matches_batch_scoring(self):
+        codes = [decode(code, 4, 6) for code in range(6 ** 4)]
+        black, white = score(np.arange(6 ** 4), np.arange(6 ** 4), 4, 6)
+        for i, guess in enumerate(codes):
+            scored = np.array([score_code(guess, secret, 6) for secret in codes]).T
+            self.assertTrue((scored[0] == black[i]).all() and (scored[1] == white[i]).all())
+
+    def test_matches_reference(self):
+        for pegs, colors in ((3, 4), (5, 3), (2, 7)):
+            codes = [decode(code, pegs, colors) for code in range(colors ** pegs)]
+            for guess in codes:
+                for secret in codes:
+                    self.assertEqual(score_code(guess, secret, colors), self.reference(guess, secret))
+
+    def test_games_agree(self):
+        game = Game(1, True)
+        for secret in range(0, 6 ** 4, 97):
+            game.secret = secret
+            for code in range(6 ** 4):
+                self.assertEqual(game.score(code), score_code(decode(code), decode(secret), 6))
+
+
+class EvilCodemakerTests(unittest.TestCase):
+    """Tests the codemaker that keeps the largest set of solutions"""
+    def test_terminal_answers_stay_consistent(self):
+        game = Game(1, True, evil=True)
+        game.create_solution()
+        game.guess_row(['R', 'R', 'B', 'B'])
+        self.assertEqual(len(game.candidates), 256)
+
+        game.solver()
+        self.assertTrue(game.game_over)
+        for code, result in game.history():
+            black, white = game.score(code)
+            self.assertEqual(black * 5 + white, result)
+
+    def test_largest_partition(self):
+        candidates = CandidateSet(4, 6, True)
+        guess = encode([0, 0, 1, 1])
+        sizes = candidates.partition(guess)
+        self.assertEqual(sizes.sum(), 6 ** 4)
+        self.assertEqual(sizes[candidates.largest_partition(guess)], sizes.max())
+
+        # a win is only given once nothing else is left
+        candidates.update(guess, 4 * 5)
+        self.assertEqual(candidates.largest_partition(guess), 4 * 5)
+
+    def test_answer_narrows_candidates(self):
+        candidates = CandidateSet(4, 6, True)
+        guess = encode([0, 0, 1, 1])
+        largest = candidates.partition(guess).max()
+        result, secret = candidates.answer(guess)
+        self.assertEqual(len(candidates), largest)
+        self.assertIn(secret, candidates)
+        self.assertEqual(candidates.ft.feedback([guess], [candidates.ft.column(secret)])[0, 0], result)
+
+    def test_large_variants_refused(self):
+        with self.assertRaises(ValueError):
+            Game(1, True, pegs=8, evil=True)
+        self.assertFalse(Game(1, True, pegs=8).evil)
+
+    def test_pygame_answers_stay_consistent(self):
+        setup.init_display(headless=True)
+        game = mastermind.Game(evil=True)
+        game.game_board()
+        game.fb_board()
+        for row in range(game.max_guesses, 0, -1):
+            for tile, color in zip(game.board[row], game.colors[row % 3:]):
+                tile.update(color)
+            game.assign_feedback(row)
+
+        self.assertEqual([tile.color for tile in game.board[0]], game.solution)
+        for code, result in game.history():
+            guess = decode(code, 4, 6)
+            sol = [game.colors.index(color) for color in game.solution]
+            self.assertEqual(score_code(guess, sol, 6), divmod(result, 5))
+
+
 if __name__ == '__main__':
     unittest.main()